@@ -3,12 +3,21 @@ SQLite database for session persistence
 """
 import sqlite3
 import json
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional
 from datetime import datetime, timezone
 from core.session.models import Session
 from core.llm import Message
 
 
+def _dump_metadata(metadata: Dict[str, Any]) -> Optional[str]:
+    """Serialize metadata, storing NULL for the common empty case
+    
+    Loaders already map NULL back to an empty dict, so most messages
+    skip JSON encoding entirely.
+    """
+    return json.dumps(metadata) if metadata else None
+
+
 class SessionDatabase:
     """SQLite database for session persistence
     
@@ -79,38 +88,58 @@ class SessionDatabase:
         Args:
             session: Session to save
         """
+        self.save_sessions([session])
+    
+    def save_sessions(self, sessions: Iterable[Session]):
+        """Save or update many sessions in a single transaction
+        
+        Args:
+            sessions: Sessions to save
+        """
         if not self.conn:
             raise RuntimeError("Not connected")
         
-        cursor = self.conn.cursor()
+        # Deleting before inserting would store a repeated session's messages
+        # twice, so keep only the last copy of each id
+        sessions = list({session.id: session for session in sessions}.values())
+        if not sessions:
+            return
         
-        # Insert or replace session
-        cursor.execute("""
-            INSERT OR REPLACE INTO sessions (id, created_at, updated_at, metadata)
-            VALUES (?, ?, ?, ?)
-        """, (
-            session.id,
-            session.created_at.isoformat() if session.created_at else datetime.now(timezone.utc).isoformat(),
-            session.updated_at.isoformat() if session.updated_at else datetime.now(timezone.utc).isoformat(),
-            json.dumps(session.metadata)
-        ))
-        
-        # Clear old messages for this session
-        cursor.execute("DELETE FROM messages WHERE session_id = ?", (session.id,))
-        
-        # Insert all messages
-        for msg in session.messages:
-            cursor.execute("""
+        now = datetime.now(timezone.utc).isoformat()
+        
+        with self.conn:
+            # Upsert sessions in a single statement per row
+            self.conn.executemany("""
+                INSERT INTO sessions (id, created_at, updated_at, metadata)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    updated_at = excluded.updated_at,
+                    metadata = excluded.metadata
+            """, (
+                (
+                    session.id,
+                    session.created_at.isoformat() if session.created_at else now,
+                    session.updated_at.isoformat() if session.updated_at else now,
+                    _dump_metadata(session.metadata)
+                )
+                for session in sessions
+            ))
+            
+            # Clear old messages for these sessions
+            self.conn.executemany(
+                "DELETE FROM messages WHERE session_id = ?",
+                ((session.id,) for session in sessions)
+            )
+            
+            # Insert all messages
+            self.conn.executemany("""
                 INSERT INTO messages (session_id, role, content, metadata)
                 VALUES (?, ?, ?, ?)
             """, (
-                session.id,
-                msg.role,
-                msg.content,
-                json.dumps(msg.metadata)
+                (session.id, msg.role, msg.content, _dump_metadata(msg.metadata))
+                for session in sessions
+                for msg in session.messages
             ))
-        
-        self.conn.commit()
     
     def load_session(self, session_id: str) -> Optional[Session]:
         """Load session by ID
@@ -54,6 +54,31 @@ class TestSessionDatabase:
             assert loaded.id == "test-123"
             assert len(loaded.messages) == 2
             assert loaded.messages[0].content == "Hello"
+            assert loaded.messages[0].metadata == {}
+            
+            db.close()
+        finally:
+            os.unlink(db_path)
+    
+    def test_metadata_round_trip(self):
+        """Test session and message metadata survive save/load"""
+        with tempfile.NamedTemporaryFile(delete=False) as tmp:
+            db_path = tmp.name
+        
+        try:
+            db = SessionDatabase(db_path)
+            db.connect()
+            db.create_schema()
+            
+            session = Session(id="meta-1", metadata={"user": "alice"})
+            session.add_message(Message(role="user", content="Hi", metadata={"lang": "en"}))
+            session.add_message(Message(role="assistant", content="Hello"))
+            db.save_session(session)
+            
+            loaded = db.load_session("meta-1")
+            assert loaded.metadata == {"user": "alice"}
+            assert loaded.messages[0].metadata == {"lang": "en"}
+            assert loaded.messages[1].metadata == {}
             
             db.close()
         finally:
@@ -98,9 +123,7 @@ class TestSessionDatabase:
             db.create_schema()
             
             # Create multiple sessions
-            for i in range(3):
-                session = Session(id=f"session-{i}")
-                db.save_session(session)
+            db.save_sessions(Session(id=f"session-{i}") for i in range(3))
             
             # List sessions
             sessions = db.list_sessions()
@@ -110,75 +133,114 @@ class TestSessionDatabase:
         finally:
             os.unlink(db_path)
 
-
-class TestSessionManagerPersistence:
-    """Test SessionManager with persistence"""
     
-    def test_session_manager_with_persistence(self):
-        """Test session manager with database"""
+    def test_save_sessions_bulk(self):
+        """Test saving many sessions with their messages at once"""
         with tempfile.NamedTemporaryFile(delete=False) as tmp:
             db_path = tmp.name
         
         try:
-            # Create database
             db = SessionDatabase(db_path)
             db.connect()
             db.create_schema()
             
-            # Create manager with database
-            manager = SessionManager(db=db)
-            
-            # Create session
-            session = manager.create_session()
-            session.add_message(Message(role="user", content="Test message"))
-            manager.persist_session(session.id)
-            
-            # Verify in memory
-            assert session.id in manager.sessions
+            sessions = []
+            for i in range(50):
+                session = Session(id=f"bulk-{i}")
+                session.add_message(Message(role="user", content=f"Hello {i}"))
+                session.add_message(Message(role="assistant", content=f"Hi {i}"))
+                sessions.append(session)
             
-            # Create new manager (simulating restart)
-            manager2 = SessionManager(db=db)
+            db.save_sessions(sessions)
+            assert db.count() == 50
             
-            # Should load session from database
-            loaded = manager2.get_session(session.id)
+            # Re-saving replaces messages instead of duplicating them
+            db.save_sessions(sessions)
+            loaded = db.load_session("bulk-7")
             assert loaded is not None
-            assert len(loaded.messages) == 1
-            assert loaded.messages[0].content == "Test message"
+            assert [m.content for m in loaded.messages] == ["Hello 7", "Hi 7"]
+            
+            # Updates keep the original row and creation time
+            created_at = loaded.created_at
+            sessions[7].metadata = {"updated": True}
+            db.save_session(sessions[7])
+            assert db.count() == 50
+            loaded = db.load_session("bulk-7")
+            assert loaded.metadata == {"updated": True}
+            assert loaded.created_at == created_at
+            
+            # Empty input is a no-op
+            db.save_sessions([])
+            assert db.count() == 50
+            
+            # A session repeated in one call is stored once, last copy wins
+            old = Session(id="bulk-dup")
+            old.add_message(Message(role="user", content="old"))
+            new = Session(id="bulk-dup")
+            new.add_message(Message(role="user", content="new"))
+            db.save_sessions([old, new, new])
+            assert db.count() == 51
+            loaded = db.load_session("bulk-dup")
+            assert [m.content for m in loaded.messages] == ["new"]
             
             db.close()
         finally:
             os.unlink(db_path)
+
+
+@pytest.fixture
+def db():
+    """In-memory session database, fresh for each test"""
+    database = SessionDatabase(":memory:")
+    database.connect()
+    database.create_schema()
+    yield database
+    database.close()
+
+
+class TestSessionManagerPersistence:
+    """Test SessionManager with persistence"""
     
-    def test_add_message_persistence(self):
+    def test_session_manager_with_persistence(self, db):
+        """Test session manager with database"""
+        # Create manager with database
+        manager = SessionManager(db=db)
+        
+        # Create session
+        session = manager.create_session()
+        session.add_message(Message(role="user", content="Test message"))
+        manager.persist_session(session.id)
+        
+        # Verify in memory
+        assert session.id in manager.sessions
+        
+        # Create new manager (simulating restart)
+        manager2 = SessionManager(db=db)
+        
+        # Should load session from database
+        loaded = manager2.get_session(session.id)
+        assert loaded is not None
+        assert len(loaded.messages) == 1
+        assert loaded.messages[0].content == "Test message"
+    
+    def test_add_message_persistence(self, db):
         """Test that add_message persists to database"""
-        with tempfile.NamedTemporaryFile(delete=False) as tmp:
-            db_path = tmp.name
+        manager = SessionManager(db=db)
         
-        try:
-            db = SessionDatabase(db_path)
-            db.connect()
-            db.create_schema()
-            
-            manager = SessionManager(db=db)
-            
-            # Create session
-            session = manager.create_session(session_id="persist-test")
-            
-            # Add messages
-            manager.add_message("persist-test", Message(role="user", content="Message 1"))
-            manager.add_message("persist-test", Message(role="assistant", content="Response 1"))
-            
-            # Create new manager and load
-            manager2 = SessionManager(db=db)
-            loaded = manager2.get_session("persist-test")
-            
-            assert loaded is not None
-            assert len(loaded.messages) == 2
-            assert loaded.messages[1].role == "assistant"
-            
-            db.close()
-        finally:
-            os.unlink(db_path)
+        # Create session
+        session = manager.create_session(session_id="persist-test")
+        
+        # Add messages
+        manager.add_message("persist-test", Message(role="user", content="Message 1"))
+        manager.add_message("persist-test", Message(role="assistant", content="Response 1"))
+        
+        # Create new manager and load
+        manager2 = SessionManager(db=db)
+        loaded = manager2.get_session("persist-test")
+        
+        assert loaded is not None
+        assert len(loaded.messages) == 2
+        assert loaded.messages[1].role == "assistant"
     
     def test_session_recovery_after_restart(self):
         """Test session recovery after simulated restart"""
@@ -0,0 +1,90 @@
+"""
+Tests for WhatsApp bot outbound message batching
+"""
+import asyncio
+
+from whatsapp_bot.bot import WhatsAppAdapter, WhatsAppBot
+from whatsapp_bot.config import WhatsAppConfig
+
+
+class FakeAdapter(WhatsAppAdapter):
+    """Adapter recording sent messages; the first send is slow"""
+
+    def __init__(self, first_delay: float = 0.0):
+        self.sent = []
+        self.first_delay = first_delay
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def send_message(self, to_number: str, content: str) -> bool:
+        if not self.sent and self.first_delay:
+            self.first_delay, delay = 0.0, self.first_delay
+            await asyncio.sleep(delay)
+        self.sent.append((to_number, content))
+        return True
+
+    def on_message(self, callback):
+        pass
+
+
+def make_bot(adapter: FakeAdapter, batch_ms: int) -> WhatsAppBot:
+    config = WhatsAppConfig()
+    config.send_batch_ms = batch_ms
+    config.max_message_length = 4000
+    return WhatsAppBot(config=config, agent=object(), adapter=adapter)
+
+
+class TestSendBatching:
+    """Test coalescing of outbound messages"""
+
+    async def test_batching_disabled_by_default(self, monkeypatch):
+        """Test that messages are sent right away without a window"""
+        monkeypatch.delenv("WHATSAPP_SEND_BATCH_MS", raising=False)
+        assert WhatsAppConfig().send_batch_ms == 0
+
+        adapter = FakeAdapter()
+        bot = make_bot(adapter, 0)
+        await bot._send_message("123", "hello")
+
+        assert adapter.sent == [("123", "hello")]
+
+    async def test_coalesces_within_window(self):
+        """Test that messages within the window become one send"""
+        adapter = FakeAdapter()
+        bot = make_bot(adapter, 10)
+        await bot._send_message("123", "a")
+        await bot._send_message("123", "b")
+        await bot._send_message("456", "c")
+        assert adapter.sent == []
+
+        await asyncio.sleep(0.05)
+
+        assert sorted(adapter.sent) == [("123", "a\nb"), ("456", "c")]
+
+    async def test_batches_keep_order(self):
+        """Test that a batch never overtakes an earlier one still sending"""
+        adapter = FakeAdapter(first_delay=0.1)
+        bot = make_bot(adapter, 10)
+        await bot._send_message("123", "first")
+        # Let the first batch start its (slow) send
+        await asyncio.sleep(0.03)
+        await bot._send_message("123", "second")
+
+        await asyncio.sleep(0.2)
+
+        assert adapter.sent == [("123", "first"), ("123", "second")]
+
+    async def test_stop_flushes_pending_and_in_flight(self):
+        """Test that stop sends pending messages and waits for sends"""
+        adapter = FakeAdapter(first_delay=0.05)
+        bot = make_bot(adapter, 1000)
+        await bot._send_message("123", "first")
+        await bot._send_message("456", "second")
+
+        await asyncio.wait_for(bot.stop(), timeout=1)
+
+        assert sorted(adapter.sent) == [("123", "first"), ("456", "second")]
@@ -0,0 +1,152 @@
+"""
+Tests for the WhatsApp webhook bridge
+"""
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from whatsapp_bridge import WhatsAppBridge
+
+
+@pytest.fixture
+def bridge(monkeypatch):
+    """Bridge using the mock LLM provider"""
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.delenv("WEBHOOK_SECRET", raising=False)
+    return WhatsAppBridge()
+
+
+def business_payload(value):
+    """Wrap a change value in a WhatsApp Business webhook envelope"""
+    return {"entry": [{"changes": [{"value": value}]}]}
+
+
+TEXT_VALUE = {
+    "messages": [{"type": "text", "text": {"body": "hello"}}],
+    "contacts": [{"wa_id": "15551234567"}],
+    "metadata": {"phone_number_id": "123"},
+}
+
+
+class TestParseWhatsAppBusiness:
+    """Test WhatsApp Business API payload parsing"""
+
+    def test_text_message(self, bridge):
+        """Test parsing a text message"""
+        assert bridge._parse_whatsapp_business(business_payload(TEXT_VALUE)) == {
+            "from": "15551234567",
+            "body": "hello",
+            "to": "123",
+        }
+
+    def test_status_update(self, bridge):
+        """Test that delivery status webhooks are ignored"""
+        value = {"statuses": [{"status": "delivered"}], "metadata": {"phone_number_id": "123"}}
+
+        assert bridge._parse_whatsapp_business(business_payload(value)) is None
+
+    def test_non_text_message(self, bridge):
+        """Test that non-text messages are ignored"""
+        value = dict(TEXT_VALUE, messages=[{"type": "image", "image": {}}])
+
+        assert bridge._parse_whatsapp_business(business_payload(value)) is None
+
+    def test_missing_contacts(self, bridge):
+        """Test that messages without contacts are ignored"""
+        value = {k: v for k, v in TEXT_VALUE.items() if k != "contacts"}
+
+        assert bridge._parse_whatsapp_business(business_payload(value)) is None
+
+    @pytest.mark.parametrize("data", [
+        {},
+        {"entry": []},
+        {"entry": "oops"},
+        {"entry": [{"changes": None}]},
+        business_payload({"messages": {"type": "text"}}),
+        business_payload(dict(TEXT_VALUE, contacts=[None])),
+    ])
+    def test_malformed_payloads(self, bridge, data):
+        """Test that malformed or wrongly typed payloads are ignored"""
+        assert bridge._parse_whatsapp_business(data) is None
+
+    def test_status_webhook_acknowledged(self, bridge):
+        """Test that ignored webhooks are acknowledged without queuing"""
+        bridge.provider = "whatsapp-business"
+        value = {"statuses": [{"status": "read"}]}
+
+        response = TestClient(bridge.app).post("/webhook", json=business_payload(value))
+
+        assert response.status_code == 200
+        assert response.json() == {"status": "ok"}
+
+
+class TestParseTwilio:
+    """Test Twilio payload parsing"""
+
+    def test_message(self, bridge):
+        """Test parsing a message and stripping the whatsapp: prefix"""
+        data = {"From": "whatsapp:+15551234567", "To": "whatsapp:+15550000000", "Body": " hi "}
+
+        assert bridge._parse_twilio(data) == {
+            "from": "+15551234567",
+            "body": "hi",
+            "to": "+15550000000",
+        }
+
+    @pytest.mark.parametrize("data", [
+        {},
+        {"From": "whatsapp:+15551234567"},
+        {"From": "whatsapp:+15551234567", "Body": "   "},
+        {"From": "whatsapp:", "Body": "hi"},
+        {"Body": "hi"},
+    ])
+    def test_ignored(self, bridge, data):
+        """Test that messages without a sender or text are ignored"""
+        assert bridge._parse_twilio(data) is None
+
+    def test_form_encoded_body(self, bridge):
+        """Test decoding Twilio's form-encoded webhook body"""
+        body = bridge._parse_body(
+            b"From=whatsapp%3A%2B15551234567&Body=hello+there",
+            "application/x-www-form-urlencoded",
+        )
+
+        assert bridge._parse_twilio(body)["body"] == "hello there"
+
+
+class TestEnqueue:
+    """Test queuing webhook messages on the background workers"""
+
+    @staticmethod
+    def post_twilio(client, sender, body):
+        return client.post("/webhook", data={"From": f"whatsapp:{sender}", "Body": body})
+
+    def test_rejected_without_workers(self, bridge):
+        """Test that messages are rejected with 503 before the app starts"""
+        response = self.post_twilio(TestClient(bridge.app), "+1555", "hi")
+
+        assert response.status_code == 503
+        assert response.json() == {"error": "Message workers are not running"}
+
+    def test_processed_in_order_and_drained_on_shutdown(self, bridge, monkeypatch):
+        """Test that each sender's messages are processed in order before shutdown"""
+        processed = []
+
+        def slow_process(message_data):
+            # Slow enough that messages are still queued at shutdown
+            time.sleep(0.02)
+            processed.append(message_data)
+
+        monkeypatch.setattr(bridge, "_process_message", slow_process)
+
+        with TestClient(bridge.app) as client:
+            for i in range(5):
+                for sender in ("+1555", "+1666"):
+                    assert self.post_twilio(client, sender, str(i)).json() == {"status": "ok"}
+            assert len(processed) < 10
+
+        for sender in ("+1555", "+1666"):
+            assert [m["body"] for m in processed if m["from"] == sender] == [str(i) for i in range(5)]
+        # Workers are gone after shutdown
+        assert self.post_twilio(TestClient(bridge.app), "+1555", "late").status_code == 503
@@ -0,0 +1,71 @@
+"""
+Tests for WhatsApp command parsing
+"""
+from whatsapp_bot.commands import CommandParser, LRUSessionMap
+
+
+class TestCommandParser:
+    """Test CommandParser"""
+    
+    def test_parse_command(self):
+        """Test prefix command parsing"""
+        parser = CommandParser(prefix="!")
+        parsed = parser.parse("!chat hello   world")
+        
+        assert parsed.type == "command"
+        assert parsed.command == "chat"
+        assert parsed.args_str == "hello   world"
+        assert parsed.args == ["hello", "world"]
+    
+    def test_mention_without_bot_number(self):
+        """Test mention stripping keeps the rest of the message intact"""
+        parser = CommandParser()
+        parsed = parser.parse("hey bot what is 2 + 2", is_group=True)
+        
+        assert parsed.type == "mention"
+        assert parsed.content == "hey what is 2 + 2"
+    
+    def test_mention_with_bot_number(self):
+        """Test mention by bot number"""
+        parser = CommandParser(bot_number="15551234567")
+        parsed = parser.parse("@15551234567 hello there", is_group=True)
+        
+        assert parsed.type == "mention"
+        assert parsed.content == "hello there"
+    
+    def test_no_mention_outside_groups(self):
+        """Test that mentions are ignored in direct chats"""
+        parser = CommandParser()
+        
+        assert parser.parse("hey bot", is_group=False).type == "none"
+
+
+class TestLRUSessionMap:
+    """Test LRUSessionMap"""
+    
+    def test_evicts_least_recently_used(self):
+        """Test that the oldest untouched user is evicted first"""
+        sessions = LRUSessionMap(max_size=2)
+        sessions["alice"] = "s1"
+        sessions["bob"] = "s2"
+        
+        # Touch alice so bob becomes least recently used
+        assert sessions.get("alice") == "s1"
+        sessions["carol"] = "s3"
+        
+        assert len(sessions) == 2
+        assert "bob" not in sessions
+        assert sessions["alice"] == "s1"
+        assert sessions["carol"] == "s3"
+    
+    def test_pop_and_delete(self):
+        """Test removing users"""
+        sessions = LRUSessionMap(max_size=2)
+        sessions["alice"] = "s1"
+        sessions["bob"] = "s2"
+        
+        assert sessions.pop("alice") == "s1"
+        assert sessions.pop("alice") is None
+        del sessions["bob"]
+        assert len(sessions) == 0
+        assert sessions.get("bob", "missing") == "missing"
@@ -0,0 +1,40 @@
+"""
+Tests for WhatsApp bot configuration
+"""
+from whatsapp_bot.config import WhatsAppConfig
+
+
+class TestOwnerNumbers:
+    """Test owner number parsing and matching"""
+
+    def test_owner_numbers_normalized(self, monkeypatch):
+        """Test that formatting is stripped and a + prefix added"""
+        monkeypatch.setenv(
+            "WHATSAPP_OWNER_NUMBERS",
+            "+1 (555) 123-4567, 4479\t1112222,,+86 138 0000 0000"
+        )
+        config = WhatsAppConfig()
+
+        assert config.owner_numbers == frozenset({
+            "+15551234567", "+44791112222", "+8613800000000"
+        })
+        assert isinstance(config.owner_numbers, frozenset)
+
+    def test_no_owners(self, monkeypatch):
+        """Test that an unset variable gives an empty set"""
+        monkeypatch.delenv("WHATSAPP_OWNER_NUMBERS", raising=False)
+
+        assert WhatsAppConfig().owner_numbers == frozenset()
+        assert not WhatsAppConfig().is_owner("+15551234567")
+
+    def test_is_owner_formatted_numbers(self, monkeypatch):
+        """Test that formatted numbers match the compact form"""
+        monkeypatch.setenv("WHATSAPP_OWNER_NUMBERS", "+15551234567")
+        config = WhatsAppConfig()
+
+        assert config.is_owner("+15551234567")
+        assert config.is_owner("15551234567")
+        assert config.is_owner("+1 (555) 123-4567")
+        assert config.is_owner("+1\t555 123 4567")
+        assert config.is_owner("+1\u00a0555\u202f123\u00a04567")
+        assert not config.is_owner("+15551234568")
@@ -0,0 +1,120 @@
+"""
+Tests for the WhatsApp Web client's event handling
+"""
+import asyncio
+
+import pytest
+
+import whatsapp_web
+from whatsapp_web import WhatsAppWebClient, _encode_frame
+
+
+async def fake_bridge(path, messages: int):
+    """Serve a bridge socket that sends `messages` message events on attach"""
+    async def handle(reader, writer):
+        header = await reader.readexactly(4)
+        await reader.readexactly(int.from_bytes(header, 'big'))
+        for i in range(messages):
+            writer.write(_encode_frame({"type": "message", "from": f"{i % 3}@c.us", "body": str(i)}))
+        await writer.drain()
+        # Keep the socket open until the client goes away
+        await reader.read()
+        writer.close()
+
+    return await asyncio.start_unix_server(handle, str(path))
+
+
+class TestDisconnect:
+    """Test disconnecting while events are still queued"""
+
+    @pytest.mark.parametrize("queue_size", [1024, 4])
+    async def test_disconnect_from_thread_with_queued_messages(
+        self, tmp_path, monkeypatch, queue_size
+    ):
+        """Test that wait_closed returns after disconnect() from another thread"""
+        monkeypatch.setattr(whatsapp_web, "EVENT_QUEUE_SIZE", queue_size)
+        client = WhatsAppWebClient("test")
+        client.socket_path = tmp_path / "bridge.sock"
+        client._loop = asyncio.get_running_loop()
+
+        handled = []
+
+        async def slow_handler(message):
+            await asyncio.sleep(0.01)
+            handled.append(message["body"])
+
+        client.on_message(slow_handler)
+
+        server = await fake_bridge(client.socket_path, 100)
+        try:
+            await client._start_connection()
+            await asyncio.sleep(0.1)
+            await asyncio.to_thread(client.disconnect)
+
+            await asyncio.wait_for(client.wait_closed(), timeout=5)
+        finally:
+            server.close()
+
+        assert 0 < len(handled) < 100
+        assert not client.connected
+
+    async def test_wait_closed_drains_queue_when_bridge_closes(self, tmp_path):
+        """Test that queued events are still handled when the bridge goes away"""
+        client = WhatsAppWebClient("test")
+        client.socket_path = tmp_path / "bridge.sock"
+        client._loop = asyncio.get_running_loop()
+
+        handled = []
+        client.on_message(lambda message: handled.append(message["body"]))
+
+        async def handle(reader, writer):
+            await reader.readexactly(int.from_bytes(await reader.readexactly(4), 'big'))
+            for i in range(10):
+                writer.write(_encode_frame({"type": "message", "from": "1@c.us", "body": str(i)}))
+            writer.close()
+
+        server = await asyncio.start_unix_server(handle, str(client.socket_path))
+        try:
+            await client._start_connection()
+            await asyncio.wait_for(client.wait_closed(), timeout=5)
+        finally:
+            server.close()
+            await client.disconnect_async()
+
+        assert handled == [str(i) for i in range(10)]
+
+
+class TestDispatch:
+    """Test per-sender ordering and the concurrency cap"""
+
+    async def test_interleaved_senders(self):
+        """Test order per sender, the concurrency cap and lock cleanup"""
+        client = WhatsAppWebClient("test")
+        client._sem = asyncio.Semaphore(whatsapp_web.MAX_CONCURRENT_DISPATCH)
+
+        running = 0
+        max_running = 0
+        handled = {}
+
+        async def handler(message):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            # Later messages finish faster, so only the lock keeps them in order
+            await asyncio.sleep(0.01 / (1 + int(message["body"])))
+            handled.setdefault(message["from"], []).append(int(message["body"]))
+            running -= 1
+
+        client.on_message(handler)
+
+        senders = [f"{i}@c.us" for i in range(8)]
+        await asyncio.gather(*(
+            client._dispatch({"type": "message", "from": sender, "body": str(n)})
+            for sender in senders
+            for n in range(5)
+        ))
+
+        assert handled == {sender: list(range(5)) for sender in senders}
+        assert max_running == whatsapp_web.MAX_CONCURRENT_DISPATCH
+        assert client._session_locks == {}
+        assert client._session_lock_refs == {}
@@ -1,93 +1,333 @@
-const { Client, LocalAuth } = require('whatsapp-web.js');
+const { Client, LocalAuth, RemoteAuth } = require('whatsapp-web.js');
 const qrcode = require('qrcode-terminal');
 const fs = require('fs');
+const net = require('net');
 const path = require('path');
 
 // 配置
 const SESSION_NAME = process.env.WHATSAPP_SESSION_NAME || 'memory-bot-session';
 const SESSION_DIR = path.join(__dirname, 'whatsapp-sessions');
 
+// 由 Python 启动时作为共享主进程运行：每个 Python 客户端通过 Unix socket
+// 发送 attach 命令接入一个会话，会话事件只发给接入该会话的客户端
+const EVENT_SOCKET = process.env.WHATSAPP_BRIDGE_SOCKET;
+const MAX_PENDING_EVENTS = 1000;
+const sessions = new Map();
+
+// 解析 socket 上的命令帧（4 字节大端长度 + JSON）
+function readFrames(sock, onFrame) {
+    let buffered = Buffer.alloc(0);
+    sock.on('data', (chunk) => {
+        buffered = buffered.length ? Buffer.concat([buffered, chunk]) : chunk;
+        while (buffered.length >= 4) {
+            const length = buffered.readUInt32BE(0);
+            if (buffered.length < 4 + length) break;
+            const payload = buffered.subarray(4, 4 + length);
+            buffered = buffered.subarray(4 + length);
+            try {
+                onFrame(JSON.parse(payload));
+            } catch (err) {
+                console.error('❌ 无法解析命令帧:', err.message);
+            }
+        }
+    });
+}
+
+if (EVENT_SOCKET) {
+    if (fs.existsSync(EVENT_SOCKET)) {
+        fs.unlinkSync(EVENT_SOCKET);
+    }
+    // 主进程退出时删除 socket，后来的客户端据此启动新的主进程
+    process.on('exit', () => {
+        try {
+            fs.unlinkSync(EVENT_SOCKET);
+        } catch (err) {}
+    });
+
+    net.createServer((sock) => {
+        let session = null;
+        readFrames(sock, (command) => {
+            if (command.cmd === 'attach' && !session) {
+                session = attachSession(command.session || SESSION_NAME, sock);
+            }
+        });
+        sock.on('close', () => session && detachSession(session, sock));
+        sock.on('error', () => {});
+    }).listen(EVENT_SOCKET);
+}
+
+function attachSession(name, sock) {
+    const session = sessions.get(name) || createSession(name);
+    session.sockets.add(sock);
+    console.log(`🔗 客户端已接入会话: ${name}`);
+    // 补发接入前产生的事件；会话早已运行时补发最近的状态
+    if (session.pending.length) {
+        sock.write(Buffer.concat(session.pending.splice(0)));
+    } else if (session.status) {
+        sock.write(session.status);
+    }
+    return session;
+}
+
+async function detachSession(session, sock) {
+    session.sockets.delete(sock);
+    if (session.sockets.size) return;
+    // 最后一个客户端断开时关闭会话，没有会话时主进程退出
+    console.log(`🔌 会话已关闭: ${session.name}`);
+    sessions.delete(session.name);
+    try {
+        await session.client.destroy();
+    } catch (err) {
+        console.error('❌ 关闭会话失败:', err.message);
+    }
+    // 关闭期间可能有新客户端接入
+    if (sessions.size === 0) {
+        process.exit(0);
+    }
+}
+
+// 同一轮事件循环内的事件合并为一次写入
+function flushEvents(session) {
+    session.flushScheduled = false;
+    const frames = session.outgoing;
+    session.outgoing = [];
+    if (session.sockets.size === 0) {
+        session.pending.push(...frames);
+        if (session.pending.length > MAX_PENDING_EVENTS) {
+            session.pending.splice(0, session.pending.length - MAX_PENDING_EVENTS);
+        }
+        return;
+    }
+    const data = frames.length === 1 ? frames[0] : Buffer.concat(frames);
+    for (const sock of session.sockets) {
+        sock.write(data);
+    }
+}
+
+// 发送结构化事件（4 字节大端长度 + JSON）
+function emit(session, event) {
+    if (!EVENT_SOCKET) return;
+    const payload = Buffer.from(JSON.stringify(event));
+    const header = Buffer.alloc(4);
+    header.writeUInt32BE(payload.length);
+    const frame = Buffer.concat([header, payload]);
+    if (event.type !== 'message') {
+        session.status = frame;
+    }
+    session.outgoing.push(frame);
+    if (!session.flushScheduled) {
+        session.flushScheduled = true;
+        setImmediate(flushEvents, session);
+    }
+}
+
 // 确保会话目录存在
 if (!fs.existsSync(SESSION_DIR)) {
     fs.mkdirSync(SESSION_DIR, { recursive: true });
 }
 
-// 创建客户端
-const client = new Client({
-    authStrategy: new LocalAuth({
+// Redis 会话存储（RemoteAuth 使用，保存压缩后的会话数据）
+class RedisStore {
+    constructor(url) {
+        const { createClient } = require('redis');
+        this.redis = createClient({ url });
+        this.redis.on('error', (err) => console.error('❌ Redis 错误:', err.message));
+        this.ready = this.redis.connect();
+    }
+
+    key(session) {
+        return `wwebjs:session:${path.basename(session)}`;
+    }
+
+    async sessionExists({ session }) {
+        await this.ready;
+        return (await this.redis.exists(this.key(session))) === 1;
+    }
+
+    async save({ session }) {
+        await this.ready;
+        const data = await fs.promises.readFile(`${session}.zip`);
+        await this.redis.set(this.key(session), data.toString('base64'));
+    }
+
+    async extract({ session, path: zipPath }) {
+        await this.ready;
+        const data = await this.redis.get(this.key(session));
+        if (data) {
+            await fs.promises.writeFile(zipPath, Buffer.from(data, 'base64'));
+        }
+    }
+
+    async delete({ session }) {
+        await this.ready;
+        await this.redis.del(this.key(session));
+    }
+}
+
+// 认证方式：设置 WHATSAPP_REDIS_URL 时使用 Redis，否则使用本地文件
+function createAuthStrategy(name) {
+    const redisUrl = process.env.WHATSAPP_REDIS_URL;
+    if (redisUrl) {
+        console.log('🗄️  使用 Redis 存储会话');
+        return new RemoteAuth({
+            store: new RedisStore(redisUrl),
+            dataPath: SESSION_DIR,
+            clientId: name,
+            backupSyncIntervalMs: 300000
+        });
+    }
+    return new LocalAuth({
         dataPath: SESSION_DIR,
-        clientId: SESSION_NAME
-    }),
-    puppeteer: {
-        headless: true,
-        args: ['--no-sandbox', '--disable-setuid-sandbox']
-    }
-});
-
-// 生成二维码
-client.on('qr', (qr) => {
-    console.log('\n🔐 请扫描二维码以登录 WhatsApp Web:');
-    qrcode.generate(qr, { small: true });
-    console.log('\n📱 扫描方法:');
-    console.log('   1. 打开手机 WhatsApp');
-    console.log('   2. 设置 → 已连接的设备 → 连接设备');
-    console.log('   3. 扫描二维码\n');
-});
-
-// 认证成功
-client.on('authenticated', () => {
-    console.log('✅ WhatsApp 认证成功！');
-});
-
-// 认证失败
-client.on('auth_failure', (msg) => {
-    console.error('❌ 认证失败:', msg);
-});
-
-// 就绪
-client.on('ready', () => {
-    console.log('🚀 WhatsApp Bot 已就绪！');
-    console.log('   等待接收消息...');
-    console.log('   按 Ctrl+C 退出\n');
-});
-
-// 接收消息
-client.on('message', async (msg) => {
-    console.log(`📩 收到消息来自 ${msg.from}: ${msg.body}`);
-    
-    // 忽略自己的消息
-    if (msg.fromMe) return;
-    
-    // 忽略群组消息（可选）
-    if (msg.from.includes('@g.us')) {
-        console.log('   忽略群组消息');
-        return;
+        clientId: name
+    });
+}
+
+// 创建会话：每个会话一个 whatsapp-web.js 客户端，共享同一个 Node.js 进程
+function createSession(name) {
+    const session = {
+        name,
+        client: null,
+        sockets: new Set(),
+        pending: [],
+        outgoing: [],
+        flushScheduled: false,
+        status: null,
+        replies: new Map(),
+        replyFlushScheduled: false
+    };
+    sessions.set(name, session);
+
+    const client = new Client({
+        authStrategy: createAuthStrategy(name),
+        puppeteer: {
+            headless: true,
+            // 优先使用系统 Chromium（由 PUPPETEER_EXECUTABLE_PATH 指定）
+            executablePath: process.env.PUPPETEER_EXECUTABLE_PATH || undefined,
+            // 单进程、无 JIT，降低每个会话的内存占用
+            args: [
+                '--no-sandbox',
+                '--single-process',
+                '--no-zygote',
+                '--disable-gpu',
+                '--disable-dev-shm-usage',
+                '--js-flags=--jitless',
+                '--renderer-process-limit=1'
+            ]
+        }
+    });
+    session.client = client;
+
+    // 生成二维码：作为主进程时由接入该会话的 Python 客户端显示
+    client.on('qr', (qr) => {
+        qrcode.generate(qr, { small: true }, (art) => {
+            emit(session, { type: 'qr', qr, art });
+            if (EVENT_SOCKET) {
+                console.log(`🔐 会话 ${session.name} 等待扫描二维码`);
+                return;
+            }
+            console.log('\n🔐 请扫描二维码以登录 WhatsApp Web:');
+            console.log(art);
+            console.log('\n📱 扫描方法:');
+            console.log('   1. 打开手机 WhatsApp');
+            console.log('   2. 设置 → 已连接的设备 → 连接设备');
+            console.log('   3. 扫描二维码\n');
+        });
+    });
+
+    // 认证成功
+    client.on('authenticated', () => {
+        console.log('✅ WhatsApp 认证成功！');
+    });
+
+    // 认证失败
+    client.on('auth_failure', (msg) => {
+        console.error('❌ 认证失败:', msg);
+        emit(session, { type: 'auth_failure', message: msg });
+    });
+
+    // 就绪
+    client.on('ready', () => {
+        console.log(`🚀 WhatsApp Bot 已就绪！(${name})`);
+        console.log('   等待接收消息...');
+        console.log('   按 Ctrl+C 退出\n');
+        // 关闭页面动画，减少无头浏览器的渲染开销
+        client.pupPage.emulateMediaFeatures([
+            { name: 'prefers-reduced-motion', value: 'reduce' }
+        ]).catch(() => {});
+        emit(session, {
+            type: 'ready',
+            user: { id: client.info.wid._serialized, name: client.info.pushname }
+        });
+    });
+
+    // 接收消息
+    client.on('message', async (msg) => {
+        // 忽略自己的消息
+        if (msg.fromMe) return;
+
+        // 忽略群组消息（可选），在序列化事件之前过滤
+        if (msg.from.endsWith('@g.us')) return;
+
+        emit(session, {
+            type: 'message',
+            id: msg.id._serialized,
+            from: msg.from,
+            body: msg.body,
+            timestamp: msg.timestamp,
+            fromMe: msg.fromMe
+        });
+
+        // 处理消息
+        const response = await processMessage(msg.body, msg.from);
+
+        // 发送回复（短时间内发给同一聊天的回复合并发送）
+        queueReply(session, msg.from, response);
+    });
+
+    // 断开连接
+    client.on('disconnected', (reason) => {
+        console.log('⚠️  WhatsApp 断开连接:', reason);
+        emit(session, { type: 'disconnected', reason });
+    });
+
+    console.log(`🚀 启动会话: ${name}`);
+    client.initialize();
+    return session;
+}
+
+// 回复合并窗口（毫秒）
+const REPLY_BATCH_MS = 10;
+
+function queueReply(session, chatId, text) {
+    const texts = session.replies.get(chatId);
+    if (texts) {
+        texts.push(text);
+    } else {
+        session.replies.set(chatId, [text]);
     }
-    
-    // 处理消息
-    const response = await processMessage(msg.body, msg.from);
-    
-    // 发送回复
-    await msg.reply(response);
-    console.log(`📤 回复: ${response.substring(0, 100)}...`);
-});
+    if (!session.replyFlushScheduled) {
+        session.replyFlushScheduled = true;
+        setTimeout(flushReplies, REPLY_BATCH_MS, session);
+    }
+}
 
-// 断开连接
-client.on('disconnected', (reason) => {
-    console.log('⚠️  WhatsApp 断开连接:', reason);
-});
+async function flushReplies(session) {
+    session.replyFlushScheduled = false;
+    const batch = [...session.replies];
+    session.replies.clear();
+    await Promise.all(batch.map(async ([chatId, texts]) => {
+        const text = texts.join('\n\n');
+        try {
+            await session.client.sendMessage(chatId, text);
+            console.log(`📤 回复 ${chatId}: ${text.substring(0, 100)}...`);
+        } catch (err) {
+            console.error(`❌ 回复 ${chatId} 失败:`, err.message);
+        }
+    }));
+}
 
-// 处理消息
-async function processMessage(message, from) {
-    // 简单命令处理
-    if (message.startsWith('!')) {
-        const parts = message.slice(1).split(' ');
-        const cmd = parts[0].toLowerCase();
-        const args = parts.slice(1);
-        
-        switch (cmd) {
-            case 'help':
-                return `🤖 *Memory Bot 帮助*
+// 命令处理表（模块加载时构建一次）
+const HELP_TEXT = `🤖 *Memory Bot 帮助*
 
 *!help* - 显示帮助
 *!chat <消息>* - 和 AI 聊天
@@ -95,40 +335,51 @@ async function processMessage(message, from) {
 *!info* - 显示会话信息
 
 或直接发送消息聊天！`;
-            
-            case 'chat':
-                if (args.length === 0) {
-                    return '请提供消息内容。用法: *!chat <消息>*';
-                }
-                return `💬 你说: ${args.join(' ')}
-
-[AI 回复将在这里]`;
-            
-            case 'clear':
-                return '✅ 会话已清除。开始新的对话！';
-            
-            case 'info':
-                return '📋 *会话信息*
-会话 ID: [会话 ID 将在这里]';
-            
-            default:
-                return `未知命令: *${cmd}*。输入 *!help* 查看可用命令。`;
+
+const CMDS = Object.freeze(Object.assign(Object.create(null), {
+    help: () => HELP_TEXT,
+
+    chat: (args) => {
+        if (args.length === 0) {
+            return '请提供消息内容。用法: *!chat <消息>*';
         }
+        return `💬 你说: ${args.join(' ')}\n\n[AI 回复将在这里]`;
+    },
+
+    clear: () => '✅ 会话已清除。开始新的对话！',
+
+    info: () => '📋 *会话信息*\n会话 ID: [会话 ID 将在这里]'
+}));
+
+function unknownCommand(cmd) {
+    return `未知命令: *${cmd}*。输入 *!help* 查看可用命令。`;
+}
+
+// 处理消息
+async function processMessage(message, from) {
+    // 简单命令处理
+    if (message.startsWith('!')) {
+        const [name, ...args] = message.slice(1).split(' ');
+        const cmd = name.toLowerCase();
+        const handler = CMDS[cmd];
+        return handler ? handler(args, from) : unknownCommand(cmd);
     }
     
     // 普通消息
-    return `收到你的消息: *${message}*
-
-我是 Memory Bot，一个会记住事情的 AI 助手。有什么可以帮你的吗？`;
+    return `收到你的消息: *${message}*\n\n我是 Memory Bot，一个会记住事情的 AI 助手。有什么可以帮你的吗？`;
 }
 
-// 启动客户端
+// 启动：单独运行时直接启动默认会话，作为主进程时等待客户端接入会话
 console.log('🚀 启动 WhatsApp Bridge...');
-client.initialize();
+if (!EVENT_SOCKET) {
+    createSession(SESSION_NAME);
+}
 
 // 处理退出
-process.on('SIGINT', async () => {
+async function shutdown() {
     console.log('\n🛑 正在关闭...');
-    await client.destroy();
+    await Promise.all([...sessions.values()].map((session) => session.client.destroy()));
     process.exit(0);
-});
+}
+process.on('SIGINT', shutdown);
+process.on('SIGTERM', shutdown);
@@ -12,7 +12,8 @@ Supports multiple WhatsApp integration methods:
 
 import logging
 import asyncio
-from typing import Optional, Any, Dict, List, Callable
+from collections import deque
+from typing import Optional, Any, Awaitable, Dict, List, Callable, Deque
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 
@@ -120,14 +121,40 @@ class WhatsAppBot:
             prefix=self.config.command_prefix,
             bot_number=self.config.phone_number
         )
-        self.command_handler = CommandHandler(agent=self.agent)
+        self.command_handler = CommandHandler(
+            agent=self.agent,
+            max_sessions=self.config.max_sessions
+        )
+        
+        # Parsed message type -> handler coroutine
+        self._dispatch: Dict[str, Callable[[WhatsAppMessage, ParsedCommand], Awaitable[None]]] = {
+            "command": self._handle_command,
+            "mention": self._handle_mention,
+            "auto_reply": self._handle_auto_reply,
+        }
         
         # Register message handler
         self.adapter.on_message(self._on_message)
         
+        # Hot-path settings, read once instead of per message
+        self._max_len = self.config.max_message_length
+        self._auto_reply = self.config.auto_reply
+        self._parallel_send = self.config.parallel_send
+        self._send_batch_delay = self.config.send_batch_ms / 1000
+        self._split = self._make_splitter(self._max_len)
+        
+        # Outbound messages waiting to be coalesced, per recipient
+        self._pending_sends: Dict[str, List[str]] = {}
+        # Latest flush per recipient; each flush waits for the one before it
+        self._flush_tasks: Dict[str, asyncio.Task] = {}
+        # Set on stop to end every batch window early
+        self._flush_now = asyncio.Event()
+        
         # State tracking
         self._running = False
-        self._message_queue: asyncio.Queue = asyncio.Queue()
+        self._validated = False
+        self._message_deque: Deque[WhatsAppMessage] = deque()
+        self._has_msg = asyncio.Event()
         
         logger.info("WhatsAppBot initialized")
     
@@ -152,22 +179,26 @@ class WhatsAppBot:
             message: WhatsAppMessage object
         """
         # Put message in queue for processing
-        await self._message_queue.put(message)
+        self._message_deque.append(message)
+        self._has_msg.set()
     
     async def _process_messages(self):
         """Process messages from the queue"""
         while self._running:
             try:
-                # Get message with timeout to allow checking _running
-                message = await asyncio.wait_for(
-                    self._message_queue.get(),
-                    timeout=1.0
-                )
-                await self._handle_message(message)
+                # Wait with timeout to allow checking _running
+                await asyncio.wait_for(self._has_msg.wait(), timeout=1.0)
             except asyncio.TimeoutError:
                 continue
-            except Exception as e:
-                logger.error(f"Error processing message: {e}")
+            
+            # Clear before draining so messages arriving mid-drain re-arm the event
+            self._has_msg.clear()
+            while self._message_deque:
+                message = self._message_deque.popleft()
+                try:
+                    await self._handle_message(message)
+                except Exception as e:
+                    logger.error(f"Error processing message: {e}")
     
     async def _handle_message(self, message: WhatsAppMessage):
         """Process a single message
@@ -176,7 +207,7 @@ class WhatsAppBot:
             message: WhatsAppMessage object
         """
         # Skip group messages (optional, can be configurable)
-        if message.is_group and not self.config.auto_reply:
+        if message.is_group and not self._auto_reply:
             return
         
         # Skip empty messages
@@ -186,16 +217,13 @@ class WhatsAppBot:
         # Parse the message
         parsed = self.parser.parse(message.content)
         
+        handler = self._dispatch.get(parsed.type)
+        # Ignore regular messages, and auto-reply messages in non-auto-reply mode
+        if handler is None or (parsed.type == "auto_reply" and not self._auto_reply):
+            return
+        
         try:
-            if parsed.type == "command":
-                await self._handle_command(message, parsed)
-            elif parsed.type == "mention":
-                await self._handle_mention(message, parsed)
-            elif parsed.type == "auto_reply" and self.config.auto_reply:
-                # Treat as direct message for auto-reply mode
-                await self._handle_direct_message(message, parsed.content)
-            # else: ignore regular messages in non-auto-reply mode
-            
+            await handler(message, parsed)
         except Exception as e:
             logger.error(f"Error processing message: {e}")
             await self._send_message(
@@ -218,7 +246,7 @@ class WhatsAppBot:
         
         result = await self.command_handler.handle_command(
             command=parsed.command,
-            args=parsed.args,
+            args=parsed.args_str,
             user_id=message.from_number
         )
         
@@ -258,6 +286,19 @@ class WhatsAppBot:
                 f"❌ {result['content']}"
             )
     
+    async def _handle_auto_reply(
+        self,
+        message: WhatsAppMessage,
+        parsed: ParsedCommand
+    ):
+        """Handle an auto-reply message as a direct message
+        
+        Args:
+            message: WhatsAppMessage object
+            parsed: ParsedCommand object
+        """
+        await self._handle_direct_message(message, parsed.content)
+    
     async def _handle_direct_message(
         self,
         message: WhatsAppMessage,
@@ -285,21 +326,109 @@ class WhatsAppBot:
                 f"❌ {result['content']}"
             )
     
-    async def _send_message(self, to_number: str, content: str):
+    async def _send_message(self, to_number: str, content: str, immediate: bool = False):
         """Send a WhatsApp message
         
+        Messages to the same recipient produced within the send batch
+        window are coalesced into as few adapter calls as possible. With
+        batching enabled, send errors are logged instead of raised.
+        
         Args:
             to_number: Recipient phone number
             content: Message content
+            immediate: Send right away, bypassing the batch window
         """
-        # Split long messages
-        max_length = self.config.max_message_length
+        if immediate or self._send_batch_delay <= 0:
+            await self._send_now(to_number, content)
+            return
+        
+        pending = self._pending_sends.get(to_number)
+        if pending is None:
+            self._pending_sends[to_number] = [content]
+            self._flush_tasks[to_number] = asyncio.create_task(
+                self._flush_pending(to_number, self._flush_tasks.get(to_number))
+            )
+        else:
+            pending.append(content)
+    
+    async def _flush_pending(self, to_number: str, previous: Optional[asyncio.Task]):
+        """Send a recipient's pending messages once the batch window ends
         
-        if len(content) <= max_length:
+        Args:
+            to_number: Recipient phone number
+            previous: Earlier flush for the same recipient, which must
+                finish sending first to keep messages in order
+        """
+        try:
+            await asyncio.wait_for(self._flush_now.wait(), self._send_batch_delay)
+        except asyncio.TimeoutError:
+            pass
+        # Later messages start a new batch from here on
+        messages = self._pending_sends.pop(to_number, [])
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            await self._send_batch(to_number, messages)
+        except Exception as e:
+            logger.error(f"Error sending messages to {to_number}: {e}")
+        finally:
+            if self._flush_tasks.get(to_number) is asyncio.current_task():
+                del self._flush_tasks[to_number]
+    
+    async def _flush_all(self):
+        """Send all pending messages and wait for flushes already sending"""
+        self._flush_now.set()
+        # Each flush waits for the previous one, so the latest covers all
+        tasks = list(self._flush_tasks.values())
+        if tasks:
+            await asyncio.wait(tasks)
+    
+    async def _send_batch(self, to_number: str, messages: List[str]):
+        """Join messages with newlines and send them in as few calls as fit
+        
+        Args:
+            to_number: Recipient phone number
+            messages: Messages to send, in order
+        """
+        batch: List[str] = []
+        size = 0
+        for content in messages:
+            if batch and size + 1 + len(content) > self._max_len:
+                await self._send_now(to_number, "\n".join(batch))
+                batch = []
+                size = 0
+            size += len(content) + 1 if batch else len(content)
+            batch.append(content)
+        
+        if batch:
+            await self._send_now(to_number, "\n".join(batch))
+    
+    async def _send_now(self, to_number: str, content: str):
+        """Send a WhatsApp message right away
+        
+        Args:
+            to_number: Recipient phone number
+            content: Message content
+        """
+        # Most replies fit in a single message
+        if len(content) <= self._max_len:
             await self.adapter.send_message(to_number, content)
         else:
-            # Split into multiple messages
-            chunks = self._split_message(content, max_length)
+            await self._send_chunked(to_number, content)
+    
+    async def _send_chunked(self, to_number: str, content: str):
+        """Split a long message and send it as multiple messages
+        
+        Args:
+            to_number: Recipient phone number
+            content: Message content
+        """
+        chunks = self._split(content)
+        if self._parallel_send:
+            await asyncio.gather(
+                *(self.adapter.send_message(to_number, chunk) for chunk in chunks)
+            )
+        else:
             for chunk in chunks:
                 await self.adapter.send_message(to_number, chunk)
     
@@ -313,52 +442,69 @@ class WhatsAppBot:
         Returns:
             List of message chunks
         """
-        chunks = []
-        current_chunk = ""
-        
-        # Try to split at newlines first
-        lines = content.split('\n')
-        
-        for line in lines:
-            if len(current_chunk) + len(line) + 1 <= max_length:
-                current_chunk += line + '\n'
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk.rstrip())
-                current_chunk = line + '\n'
-        
-        if current_chunk:
-            chunks.append(current_chunk.rstrip())
-        
-        # If any chunk is still too long, force split
-        final_chunks = []
-        for chunk in chunks:
-            while len(chunk) > max_length:
-                final_chunks.append(chunk[:max_length])
-                chunk = chunk[max_length:]
-            if chunk:
-                final_chunks.append(chunk)
-        
-        return final_chunks if final_chunks else [content[:max_length]]
+        return self._make_splitter(max_length)(content)
+    
+    @staticmethod
+    def _make_splitter(max_length: int) -> Callable[[str], List[str]]:
+        """Build a message splitter specialized for a fixed max length
+        
+        Args:
+            max_length: Maximum chunk length
+            
+        Returns:
+            Function splitting message content into chunks
+        """
+        def append_chunk(chunks: List[str], chunk: str):
+            # Force split chunks that are still too long
+            for i in range(0, len(chunk), max_length):
+                chunks.append(chunk[i:i + max_length])
+        
+        def split(content: str) -> List[str]:
+            chunks: List[str] = []
+            find = content.find
+            length = len(content)
+            chunk_start = 0
+            line_start = 0
+            
+            # Try to split at newlines first, slicing each chunk out of the
+            # original string once instead of building it line by line
+            while line_start <= length:
+                line_end = find('\n', line_start)
+                if line_end == -1:
+                    line_end = length
+                if line_end + 1 - chunk_start > max_length and line_start > chunk_start:
+                    append_chunk(chunks, content[chunk_start:line_start].rstrip())
+                    chunk_start = line_start
+                line_start = line_end + 1
+            
+            append_chunk(chunks, content[chunk_start:].rstrip())
+            
+            return chunks if chunks else [content[:max_length]]
+        
+        return split
     
     async def start(self):
         """Start the WhatsApp bot"""
         logger.info("Starting WhatsApp bot...")
         
-        # Validate config
-        errors = self.config.validate()
-        if errors:
-            raise ValueError(f"Configuration errors: {', '.join(errors)}")
+        # Validate config (only once per bot)
+        if not self._validated:
+            errors = self.config.validate()
+            if errors:
+                raise ValueError(f"Configuration errors: {', '.join(errors)}")
+            self._validated = True
         
         # Connect to WhatsApp
         await self.adapter.connect()
         
         # Start processing messages
         self._running = True
+        self._flush_now.clear()
         await self._process_messages()
     
     async def stop(self):
         """Stop the WhatsApp bot"""
         logger.info("Stopping WhatsApp bot...")
         self._running = False
+        await self._flush_all()
         await self.adapter.disconnect()
\ No newline at end of file
@@ -6,21 +6,122 @@ Handles command parsing and execution for the WhatsApp bot.
 
 import re
 import logging
-from typing import Dict, Any, List, Optional, Tuple
-from dataclasses import dataclass, field
+import functools
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 
-@dataclass
-class ParsedCommand:
-    """Parsed command result"""
+class ParsedCommand(NamedTuple):
+    """Parsed command result (immutable)"""
     type: str  # 'command', 'mention', 'auto_reply', 'none'
     command: Optional[str] = None
-    args: List[str] = field(default_factory=list)
+    args_str: str = ""  # Raw argument text after the command name
     content: str = ""
     raw: str = ""
+    
+    @property
+    def args(self) -> List[str]:
+        """Command arguments split on whitespace"""
+        return self.args_str.split()
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_mention(bot_number: str) -> re.Pattern:
+    """Compile (and cache) the mention pattern for a bot number
+    
+    An empty bot number must not add an empty alternative, which would
+    match (and strip) every run of whitespace and digits.
+    """
+    keywords = f"bot|{re.escape(bot_number)}" if bot_number else "bot"
+    return re.compile(rf'@?\+?\d*\s*(?:{keywords})', re.IGNORECASE)
+
+
+# Default cap on tracked user sessions
+DEFAULT_MAX_SESSIONS = 10000
+
+# Shared result for empty messages
+_NONE = ParsedCommand(type="none")
+
+_HELP_TEXT: str = """🤖 *Memory Bot - Available Commands*
+
+*General Commands:*
+`!help` - Show this help message
+`!chat <message>` - Chat with the AI
+`!clear` - Clear your current session history
+
+*Session Commands:*
+`!session info` - Show your current session info
+
+*Memory Commands:*
+`!memory search <query>` - Search your memory
+`!memory stats` - Show memory statistics
+
+*Tip:* Just send a message and I'll respond!
+"""
+
+# Shared !help response (callers must not mutate it)
+_HELP_RESPONSE: Dict[str, Any] = {"success": True, "content": _HELP_TEXT}
+
+
+class LRUSessionMap:
+    """user_id -> session_id map with least-recently-used eviction
+    
+    Keeps memory bounded on public bots where every phone number that
+    ever sends a message would otherwise stay resident forever. Every
+    access goes through one lock, so the map is safe to share between
+    threaded request handlers.
+    """
+    
+    def __init__(self, max_size: int = DEFAULT_MAX_SESSIONS):
+        """Initialize map
+        
+        Args:
+            max_size: Maximum number of users to keep
+        """
+        self.max_size = max_size
+        self._data: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Get session ID and mark the user as recently used"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+            return default
+    
+    def pop(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Remove a user and return their session ID"""
+        with self._lock:
+            return self._data.pop(key, default)
+    
+    def __getitem__(self, key: str) -> str:
+        with self._lock:
+            self._data.move_to_end(key)
+            return self._data[key]
+    
+    def __setitem__(self, key: str, value: str):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def __delitem__(self, key: str):
+        with self._lock:
+            del self._data[key]
+    
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            return key in self._data
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
 
 
 class CommandParser:
@@ -46,13 +147,13 @@ class CommandParser:
             auto_reply: Whether to auto-reply to all messages
         """
         self.prefix = prefix
+        self._prefix_len = len(prefix)
         self.bot_number = bot_number
         self.auto_reply = auto_reply
-        # Regex pattern for bot mention (various formats)
-        self.mention_pattern = re.compile(
-            rf'@?\+?\d*\s*(?:bot|{re.escape(bot_number or "")})',
-            re.IGNORECASE
-        )
+        # Keywords for fast mention detection
+        self._mention_keywords = self._build_mention_keywords(bot_number)
+        # Regex pattern for stripping bot mentions (various formats)
+        self.mention_pattern = _compile_mention(bot_number or "")
     
     def parse(self, content: str, is_group: bool = False) -> ParsedCommand:
         """Parse message content
@@ -64,13 +165,12 @@ class CommandParser:
         Returns:
             ParsedCommand with type and parsed data
         """
-        if not content or not content.strip():
-            return ParsedCommand(type="none", raw=content)
-        
-        content = content.strip()
+        content = content.strip() if content else ""
+        if not content:
+            return _NONE
         
         # Check for command prefix
-        if content.startswith(self.prefix):
+        if content[:self._prefix_len] == self.prefix:
             return self._parse_command(content)
         
         # Check for mention in group chats
@@ -88,10 +188,15 @@ class CommandParser:
         # Regular message, ignore
         return ParsedCommand(type="none", raw=content)
     
+    @staticmethod
+    def _build_mention_keywords(bot_number: Optional[str]) -> Tuple[str, ...]:
+        """Build casefolded keywords that identify a bot mention"""
+        return tuple(k.casefold() for k in ("bot", bot_number) if k)
+    
     def _is_mention(self, content: str) -> bool:
         """Check if message contains bot mention"""
-        match = self.mention_pattern.search(content)
-        return match is not None
+        lowered = content.casefold()
+        return any(k in lowered for k in self._mention_keywords)
     
     def _parse_mention(self, content: str) -> ParsedCommand:
         """Parse mention message"""
@@ -107,20 +212,20 @@ class CommandParser:
     def _parse_command(self, content: str) -> ParsedCommand:
         """Parse command message"""
         # Remove prefix
-        without_prefix = content[len(self.prefix):].strip()
+        without_prefix = content.removeprefix(self.prefix).strip()
         
         if not without_prefix:
             return ParsedCommand(type="none", raw=content)
         
-        # Split into command and arguments
-        parts = without_prefix.split()
+        # Split into command and the raw argument remainder
+        parts = without_prefix.split(None, 1)
         command = parts[0].lower()
-        args = parts[1:] if len(parts) > 1 else []
+        args_str = parts[1] if len(parts) > 1 else ""
         
         return ParsedCommand(
             type="command",
             command=command,
-            args=args,
+            args_str=args_str,
             content=without_prefix,
             raw=content
         )
@@ -128,10 +233,8 @@ class CommandParser:
     def update_bot_number(self, bot_number: str):
         """Update bot number for mention detection"""
         self.bot_number = bot_number
-        self.mention_pattern = re.compile(
-            rf'@?\+?\d*\s*(?:bot|{re.escape(bot_number)})',
-            re.IGNORECASE
-        )
+        self._mention_keywords = self._build_mention_keywords(bot_number)
+        self.mention_pattern = _compile_mention(bot_number)
 
 
 class CommandHandler:
@@ -141,52 +244,47 @@ class CommandHandler:
     This class is shared between Discord and WhatsApp bots.
     """
     
-    def __init__(self, agent: Any):
+    # Commands dispatched to the matching _handle_<command> method
+    _COMMAND_NAMES = frozenset({"help", "chat", "memory", "session", "clear"})
+    
+    def __init__(self, agent: Any, max_sessions: int = DEFAULT_MAX_SESSIONS):
         """Initialize command handler
         
         Args:
             agent: AgentEngine instance for processing requests
+            max_sessions: Maximum number of user sessions to track
         """
         self.agent = agent
-        self.user_sessions: Dict[str, str] = {}  # user_id -> session_id
-        
-        # Command handlers mapping
-        self.command_map = {
-            "help": self._handle_help,
-            "chat": self._handle_chat,
-            "memory": self._handle_memory,
-            "session": self._handle_session,
-            "clear": self._handle_clear,
-        }
+        self.user_sessions = LRUSessionMap(max_sessions)  # user_id -> session_id
     
     async def handle_command(
         self,
         command: str,
-        args: List[str],
+        args: str,
         user_id: str
     ) -> Dict[str, Any]:
         """Handle a command
         
         Args:
             command: Command name
-            args: Command arguments
+            args: Raw command argument text
             user_id: WhatsApp user ID (phone number)
             
         Returns:
             Response dict with success status and content
         """
-        handler = self.command_map.get(command)
-        
-        if not handler:
+        if command not in self._COMMAND_NAMES:
             return {
                 "success": False,
                 "content": f"Unknown command: `{command}`. Type `{self._get_prefix()}help` for available commands."
             }
         
+        handler = getattr(self, f"_handle_{command}")
+        
         try:
             return await handler(args, user_id)
         except Exception as e:
-            logger.error(f"Error handling command '{command}': {e}")
+            logger.error("Error handling command '%s': %s", command, e)
             return {
                 "success": False,
                 "content": f"An error occurred while processing the command: {str(e)}"
@@ -206,37 +304,18 @@ class CommandHandler:
         Returns:
             Response dict
         """
-        return await self._handle_chat([content], user_id)
+        return await self._handle_chat(content, user_id)
     
     def _get_prefix(self) -> str:
         """Get command prefix (for help text)"""
         # This should be synced with the actual prefix from config
         return "!"
     
-    async def _handle_help(self, args: List[str], user_id: str) -> Dict[str, Any]:
+    async def _handle_help(self, args: str, user_id: str) -> Dict[str, Any]:
         """Handle !help command"""
-        help_text = """🤖 *Memory Bot - Available Commands*
-
-*General Commands:*
-`!help` - Show this help message
-`!chat <message>` - Chat with the AI
-`!clear` - Clear your current session history
-
-*Session Commands:*
-`!session info` - Show your current session info
-
-*Memory Commands:*
-`!memory search <query>` - Search your memory
-`!memory stats` - Show memory statistics
-
-*Tip:* Just send a message and I'll respond!
-"""
-        return {
-            "success": True,
-            "content": help_text
-        }
+        return _HELP_RESPONSE
     
-    async def _handle_chat(self, args: List[str], user_id: str) -> Dict[str, Any]:
+    async def _handle_chat(self, args: str, user_id: str) -> Dict[str, Any]:
         """Handle !chat command or direct message"""
         if not args:
             return {
@@ -244,7 +323,7 @@ class CommandHandler:
                 "content": "Please provide a message. Usage: `!chat <message>`"
             }
         
-        message = " ".join(args)
+        message = args
         
         # Get or create session for user
         session_id = self.user_sessions.get(user_id)
@@ -269,7 +348,7 @@ class CommandHandler:
             }
         }
     
-    async def _handle_memory(self, args: List[str], user_id: str) -> Dict[str, Any]:
+    async def _handle_memory(self, args: str, user_id: str) -> Dict[str, Any]:
         """Handle !memory command"""
         if not args:
             return {
@@ -277,15 +356,16 @@ class CommandHandler:
                 "content": "Please specify a subcommand. Usage: `!memory <search|stats>`"
             }
         
-        subcommand = args[0].lower()
+        parts = args.split(None, 1)
+        subcommand = parts[0].lower()
         
         if subcommand == "search":
-            if len(args) < 2:
+            if len(parts) < 2:
                 return {
                     "success": False,
                     "content": "Please provide a search query. Usage: `!memory search <query>`"
                 }
-            query = " ".join(args[1:])
+            query = parts[1]
             # TODO: Implement memory search
             return {
                 "success": True,
@@ -305,7 +385,7 @@ class CommandHandler:
                 "content": f"Unknown memory subcommand: `{subcommand}`. Use `search` or `stats`."
             }
     
-    async def _handle_session(self, args: List[str], user_id: str) -> Dict[str, Any]:
+    async def _handle_session(self, args: str, user_id: str) -> Dict[str, Any]:
         """Handle !session command"""
         if not args:
             return {
@@ -313,7 +393,7 @@ class CommandHandler:
                 "content": "Please specify a subcommand. Usage: `!session <info|list>`"
             }
         
-        subcommand = args[0].lower()
+        subcommand = args.split(None, 1)[0].lower()
         session_id = self.user_sessions.get(user_id)
         
         if subcommand == "info":
@@ -341,12 +421,10 @@ class CommandHandler:
                 "content": f"Unknown session subcommand: `{subcommand}`. Use `info` or `list`."
             }
     
-    async def _handle_clear(self, args: List[str], user_id: str) -> Dict[str, Any]:
+    async def _handle_clear(self, args: str, user_id: str) -> Dict[str, Any]:
         """Handle !clear command - clear user's session"""
-        if user_id in self.user_sessions:
-            old_session = self.user_sessions[user_id]
-            del self.user_sessions[user_id]
-            
+        old_session = self.user_sessions.pop(user_id)
+        if old_session is not None:
             return {
                 "success": True,
                 "content": f"🧹 *Session Cleared*\n\nPrevious session `{old_session}` has been cleared. Starting fresh!"
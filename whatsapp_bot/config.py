@@ -5,7 +5,13 @@ Handles environment variables and configuration for the WhatsApp bot.
 """
 
 import os
-from typing import Optional, List
+from functools import cached_property
+from typing import FrozenSet, Optional, List
+
+
+# Whitespace (including non-breaking spaces) and formatting characters
+# stripped from phone numbers in a single pass
+_PHONE_STRIP = str.maketrans("", "", " \t\n\r\u00a0\u202f-()")
 
 
 class WhatsAppConfig:
@@ -25,56 +31,102 @@ class WhatsAppConfig:
         WHATSAPP_LOG_LEVEL: Logging level (default: INFO)
         WHATSAPP_QR_TIMEOUT: QR code scan timeout in seconds (default: 60)
         WHATSAPP_AUTO_REPLY: Enable auto-reply to all messages (default: False)
+        WHATSAPP_PARALLEL_SEND: Send message chunks concurrently (default: False)
+        WHATSAPP_SEND_BATCH_MS: Window for coalescing replies per recipient, 0 disables (default: 0)
+        WHATSAPP_MAX_SESSIONS: Max user sessions kept in memory, LRU evicted (default: 10000)
     """
     
     def __init__(self):
-        """Initialize configuration from environment variables"""
-        # WhatsApp connection settings
-        self.phone_number = self._get_env("WHATSAPP_PHONE_NUMBER", "")
-        self.session_id = self._get_env("WHATSAPP_SESSION_ID", "memory-bot-session")
+        """Initialize configuration
         
-        # Command and message settings
-        self.command_prefix = self._get_env("WHATSAPP_COMMAND_PREFIX", "!")
-        self.description = self._get_env(
+        Environment variables are read lazily, on first access of each
+        setting, and cached on the instance.
+        """
+        # Bot metadata (will be set after bot starts)
+        self.bot_id: Optional[str] = None
+        self.bot_name: Optional[str] = None
+    
+    # WhatsApp connection settings
+    
+    @cached_property
+    def phone_number(self) -> str:
+        return self._get_env("WHATSAPP_PHONE_NUMBER", "")
+    
+    @cached_property
+    def session_id(self) -> str:
+        return self._get_env("WHATSAPP_SESSION_ID", "memory-bot-session")
+    
+    # Command and message settings
+    
+    @cached_property
+    def command_prefix(self) -> str:
+        return self._get_env("WHATSAPP_COMMAND_PREFIX", "!")
+    
+    @cached_property
+    def description(self) -> str:
+        return self._get_env(
             "WHATSAPP_DESCRIPTION",
             "Memory Bot - AI with long-term memory"
         )
-        self.owner_numbers = self._parse_number_list(
+    
+    @cached_property
+    def owner_numbers(self) -> FrozenSet[str]:
+        return self._parse_number_list(
             self._get_env("WHATSAPP_OWNER_NUMBERS", "")
         )
-        self.max_message_length = int(
-            self._get_env("WHATSAPP_MAX_MESSAGE_LENGTH", "4000")
-        )
-        self.default_session_timeout = int(
-            self._get_env("WHATSAPP_DEFAULT_SESSION_TIMEOUT", "60")
-        )
-        self.log_level = self._get_env("WHATSAPP_LOG_LEVEL", "INFO")
-        
-        # WhatsApp-specific settings
-        self.qr_timeout = int(self._get_env("WHATSAPP_QR_TIMEOUT", "60"))
-        self.auto_reply = self._get_env("WHATSAPP_AUTO_REPLY", "false").lower() == "true"
-        
-        # Bot metadata (will be set after bot starts)
-        self.bot_id: Optional[str] = None
-        self.bot_name: Optional[str] = None
+    
+    @cached_property
+    def max_message_length(self) -> int:
+        return int(self._get_env("WHATSAPP_MAX_MESSAGE_LENGTH", "4000"))
+    
+    @cached_property
+    def default_session_timeout(self) -> int:
+        return int(self._get_env("WHATSAPP_DEFAULT_SESSION_TIMEOUT", "60"))
+    
+    @cached_property
+    def log_level(self) -> str:
+        return self._get_env("WHATSAPP_LOG_LEVEL", "INFO")
+    
+    # WhatsApp-specific settings
+    
+    @cached_property
+    def qr_timeout(self) -> int:
+        return int(self._get_env("WHATSAPP_QR_TIMEOUT", "60"))
+    
+    @cached_property
+    def auto_reply(self) -> bool:
+        return self._get_env("WHATSAPP_AUTO_REPLY", "false").lower() == "true"
+    
+    @cached_property
+    def parallel_send(self) -> bool:
+        # Only enable for adapters that preserve per-recipient order
+        return self._get_env("WHATSAPP_PARALLEL_SEND", "false").lower() == "true"
+    
+    @cached_property
+    def send_batch_ms(self) -> int:
+        return int(self._get_env("WHATSAPP_SEND_BATCH_MS", "0"))
+    
+    @cached_property
+    def max_sessions(self) -> int:
+        return int(self._get_env("WHATSAPP_MAX_SESSIONS", "10000"))
     
     def _get_env(self, key: str, default: str) -> str:
         """Get environment variable with default"""
         return os.environ.get(key, default)
     
-    def _parse_number_list(self, value: str) -> List[str]:
-        """Parse comma-separated list of phone numbers"""
+    def _parse_number_list(self, value: str) -> FrozenSet[str]:
+        """Parse comma-separated list of phone numbers into a set"""
         if not value:
-            return []
-        # Normalize phone numbers (remove spaces, ensure + prefix)
-        numbers = []
+            return frozenset()
+        # Normalize phone numbers (remove formatting, ensure + prefix)
+        numbers = set()
         for num in value.split(","):
-            num = num.strip().replace(" ", "")
+            num = num.translate(_PHONE_STRIP)
             if num:
                 if not num.startswith("+"):
                     num = "+" + num
-                numbers.append(num)
-        return numbers
+                numbers.add(num)
+        return frozenset(numbers)
     
     def is_owner(self, phone_number: str) -> bool:
         """Check if user is a bot owner
@@ -86,7 +138,7 @@ class WhatsAppConfig:
             True if user is an owner
         """
         # Normalize phone number
-        normalized = phone_number.strip().replace(" ", "")
+        normalized = phone_number.translate(_PHONE_STRIP)
         if not normalized.startswith("+"):
             normalized = "+" + normalized
         
@@ -112,6 +164,12 @@ class WhatsAppConfig:
         if self.qr_timeout < 10:
             errors.append("QR timeout too small (min 10 seconds)")
         
+        if self.send_batch_ms < 0:
+            errors.append("Send batch window cannot be negative")
+        
+        if self.max_sessions < 1:
+            errors.append("Max sessions too small (min 1)")
+        
         return errors
 
 
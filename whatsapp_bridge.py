@@ -17,20 +17,42 @@ Environment Variables:
     - WHATSAPP_ACCESS_TOKEN, WHATSAPP_PHONE_NUMBER_ID
     - OPENAI_API_KEY: For the AI responses
     - WEBHOOK_SECRET: For validating webhooks
+    - WHATSAPP_MAX_SESSIONS: Max user sessions kept in memory (default: 10000)
+    - WHATSAPP_BRIDGE_WORKERS: Background message workers (default: 4)
     - PORT: Server port (default: 5000)
 """
 
 import os
 import sys
 import json
+import asyncio
 import hmac
 import hashlib
 import logging
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from contextlib import asynccontextmanager
 from datetime import datetime
-from functools import wraps
+from urllib.parse import parse_qsl
 
-from flask import Flask, request, jsonify
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Add project root to path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+from core.agent import AgentEngine  # noqa: E402
+from core.llm.mock import MockLLMProvider  # noqa: E402
+from core.llm.openai import OpenAIProvider  # noqa: E402
+from whatsapp_bot.commands import DEFAULT_MAX_SESSIONS, LRUSessionMap  # noqa: E402
 
 # Configure logging
 logging.basicConfig(
@@ -39,9 +61,42 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Add project root to path
-project_root = os.path.dirname(os.path.abspath(__file__))
-sys.path.insert(0, project_root)
+
+_HELP_TEXT = """
+🤖 *Memory Bot Commands*
+
+*!help* - Show this help
+*!chat <message>* - Chat with AI
+*!clear* - Clear session
+*!session info* - Show session info
+
+Or just send a message to chat directly!
+"""
+
+# Seconds a serialized /status response is reused (load balancer health checks)
+STATUS_CACHE_TTL = 1.0
+
+# Seconds to let workers drain queued messages on shutdown
+SHUTDOWN_DRAIN_TIMEOUT = 10.0
+
+_UNKNOWN_FMT = "Unknown command: *{}*. Type *!help* for available commands."
+
+
+def _loads(data: bytes) -> Any:
+    """Decode a JSON request body (orjson when available)"""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _dumps(obj: Any) -> bytes:
+    """Encode a JSON response body (orjson when available)"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _json_response(content: Any, status_code: int = 200) -> Response:
+    """Build a JSON response (orjson-encoded when available)"""
+    return Response(_dumps(content), status_code=status_code, media_type="application/json")
 
 
 class WhatsAppBridge:
@@ -57,32 +112,54 @@ class WhatsAppBridge:
     - Message parsing and formatting
     - Agent interaction
     - Response sending
+    
+    The webhook is served by an ASGI app (FastAPI) and acknowledged
+    immediately; messages are queued and processed by background workers,
+    with blocking agent calls run in a thread pool. Each sender is pinned
+    to one worker so their messages are handled in order.
     """
     
+    # Command name -> handler method name
+    _HANDLERS = {
+        "help": "_cmd_help",
+        "chat": "_cmd_chat",
+        "clear": "_cmd_clear",
+        "session": "_cmd_session",
+    }
+    
     def __init__(self):
-        self.app = Flask(__name__)
-        self._setup_routes()
-        self._init_agent()
-        
         # Configuration
         self.provider = os.getenv("WHATSAPP_PROVIDER", "twilio")
         self.webhook_secret = os.getenv("WEBHOOK_SECRET", "")
+        self._webhook_secret_bytes = self.webhook_secret.encode()
+        self.num_workers = max(1, int(os.getenv("WHATSAPP_BRIDGE_WORKERS", "4")))
+        
+        # Per-worker message queues (created when the app starts)
+        self._queues: List[asyncio.Queue] = []
+        
+        # (expires_at, body) for the /status response
+        self._status_cache: Tuple[float, bytes] = (0.0, b"")
+        
+        self.app = FastAPI(
+            title="Memory-Bot WhatsApp Bridge",
+            lifespan=self._lifespan
+        )
+        self._setup_routes()
+        self._init_agent()
         
-        # Session tracking
-        self.user_sessions: Dict[str, str] = {}
+        # Session tracking (LRU bounded)
+        self.user_sessions = LRUSessionMap(
+            int(os.getenv("WHATSAPP_MAX_SESSIONS", str(DEFAULT_MAX_SESSIONS)))
+        )
         
-        logger.info(f"WhatsApp Bridge initialized with provider: {self.provider}")
+        logger.info("WhatsApp Bridge initialized with provider: %s", self.provider)
     
     def _init_agent(self):
         """Initialize the memory-bot Agent"""
         try:
-            from core.llm.openai import OpenAIProvider
-            from core.agent import AgentEngine
-            
             api_key = os.getenv("OPENAI_API_KEY")
             if not api_key:
                 logger.warning("OPENAI_API_KEY not set. Using mock provider for testing.")
-                from core.llm.mock import MockLLMProvider
                 llm = MockLLMProvider(api_key="test", model="gpt-4")
             else:
                 llm = OpenAIProvider(api_key=api_key, model="gpt-4")
@@ -91,53 +168,122 @@ class WhatsAppBridge:
             logger.info("Agent initialized successfully")
             
         except Exception as e:
-            logger.error(f"Failed to initialize agent: {e}")
+            logger.error("Failed to initialize agent: %s", e)
             raise
     
+    @asynccontextmanager
+    async def _lifespan(self, app: FastAPI):
+        """Run background message workers for the app's lifetime"""
+        self._queues = [asyncio.Queue() for _ in range(self.num_workers)]
+        workers = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+        try:
+            yield
+        finally:
+            # Stop accepting messages, then let the workers finish queued ones
+            queues, self._queues = self._queues, []
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(queue.join() for queue in queues)),
+                    SHUTDOWN_DRAIN_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                logger.warning(
+                    "Dropping %d queued messages on shutdown",
+                    sum(queue.qsize() for queue in queues)
+                )
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+    
+    async def _worker(self, queue: asyncio.Queue):
+        """Process queued messages one at a time"""
+        while True:
+            message_data = await queue.get()
+            try:
+                # Agent calls block, keep them off the event loop
+                await run_in_threadpool(self._process_message, message_data)
+            except Exception as e:
+                logger.error("Error processing queued message: %s", e)
+            finally:
+                queue.task_done()
+    
+    def _enqueue(self, message_data: Dict) -> bool:
+        """Queue a message on its sender's worker
+        
+        Returns:
+            False if the workers are not running (app not started or
+            shutting down)
+        """
+        queues = self._queues
+        if not queues:
+            return False
+        queues[hash(message_data["from"]) % len(queues)].put_nowait(message_data)
+        return True
+    
     def _setup_routes(self):
-        """Setup Flask routes"""
+        """Setup HTTP routes"""
+        
+        @self.app.get('/webhook')
+        async def verify(request: Request):
+            """Handle webhook verification"""
+            return self._handle_verification(request)
         
-        @self.app.route('/webhook', methods=['GET', 'POST'])
-        def webhook():
+        @self.app.post('/webhook')
+        async def webhook(request: Request):
             """Handle incoming webhook"""
-            if request.method == 'GET':
-                return self._handle_verification()
-            else:
-                return self._handle_message()
+            return await self._handle_message(request)
         
-        @self.app.route('/status', methods=['GET'])
-        def status():
+        @self.app.get('/status')
+        async def status():
             """Health check"""
-            return jsonify({
-                "status": "ok",
-                "provider": self.provider,
-                "timestamp": datetime.now().isoformat()
-            })
+            return Response(content=self._status_body(), media_type='application/json')
+        
+        # The root response never changes, so serialize it once
+        index_body = _dumps({
+            "service": "Memory-Bot WhatsApp Bridge",
+            "version": "1.0.0",
+            "provider": self.provider,
+            "docs": "/status"
+        })
         
-        @self.app.route('/', methods=['GET'])
-        def index():
+        @self.app.get('/')
+        async def index():
             """Root endpoint"""
-            return jsonify({
-                "service": "Memory-Bot WhatsApp Bridge",
-                "version": "1.0.0",
+            return Response(content=index_body, media_type='application/json')
+    
+    def _status_body(self) -> bytes:
+        """Serialized /status body, rebuilt at most once per second"""
+        now = time.monotonic()
+        expires_at, body = self._status_cache
+        if now >= expires_at:
+            body = _dumps({
+                "status": "ok",
                 "provider": self.provider,
-                "docs": "/status"
+                "timestamp": datetime.now().isoformat()
             })
+            self._status_cache = (now + STATUS_CACHE_TTL, body)
+        return body
     
-    def _handle_verification(self):
+    def _handle_verification(self, request: Request) -> PlainTextResponse:
         """Handle webhook verification"""
-        challenge = request.args.get('hub.challenge')
-        verify_token = request.args.get('hub.verify_token')
+        challenge = request.query_params.get('hub.challenge')
+        verify_token = request.query_params.get('hub.verify_token')
         
-        if self.webhook_secret and verify_token == self.webhook_secret:
-            return challenge, 200
+        # Constant-time comparison to avoid leaking the secret via timing
+        if self.webhook_secret and hmac.compare_digest(
+            (verify_token or "").encode(), self._webhook_secret_bytes
+        ):
+            return PlainTextResponse(challenge or "")
         
-        return "OK", 200
+        return PlainTextResponse("OK")
     
-    def _handle_message(self):
+    async def _handle_message(self, request: Request) -> Response:
         """Handle incoming message"""
         try:
-            data = request.get_json() or request.form.to_dict()
+            data = self._parse_body(
+                await request.body(),
+                request.headers.get('content-type', '')
+            )
             
             # Parse based on provider
             if self.provider == "twilio":
@@ -146,59 +292,65 @@ class WhatsAppBridge:
                 message_data = self._parse_whatsapp_business(data)
             
             if not message_data:
-                return jsonify({"status": "ok"}), 200
+                return _json_response({"status": "ok"})
             
-            # Process message
-            self._process_message(message_data)
+            # Acknowledge now, reply later via the outbound API
+            if not self._enqueue(message_data):
+                logger.error("Message workers are not running, rejecting message")
+                return _json_response(
+                    {"error": "Message workers are not running"}, status_code=503
+                )
             
-            return jsonify({"status": "ok"}), 200
+            return _json_response({"status": "ok"})
             
         except Exception as e:
-            logger.error(f"Error handling message: {e}")
-            return jsonify({"error": str(e)}), 500
+            logger.error("Error handling message: %s", e)
+            return _json_response({"error": str(e)}, status_code=500)
+    
+    def _parse_body(self, body: bytes, content_type: str) -> Dict:
+        """Decode a webhook body (JSON or form-encoded)"""
+        if content_type.startswith('application/json'):
+            return _loads(body) if body else {}
+        # Twilio posts application/x-www-form-urlencoded
+        return dict(parse_qsl(body.decode()))
     
     def _parse_twilio(self, data: Dict) -> Optional[Dict]:
         """Parse Twilio webhook data"""
-        from_number = data.get('From', '').replace('whatsapp:', '')
-        body = data.get('Body', '').strip()
-        
+        from_number = data.get('From', '').removeprefix('whatsapp:').strip()
+        body = data.get('Body')
         if not from_number or not body:
             return None
         
+        body = body.strip()
+        if not body:
+            return None
+        
         return {
             "from": from_number,
             "body": body,
-            "to": data.get('To', '').replace('whatsapp:', '')
+            "to": data.get('To', '').removeprefix('whatsapp:').strip()
         }
     
     def _parse_whatsapp_business(self, data: Dict) -> Optional[Dict]:
-        """Parse WhatsApp Business API data"""
+        """Parse WhatsApp Business API data
+        
+        Non-message events (e.g. delivery statuses) and malformed
+        payloads yield None.
+        """
         try:
-            entry = data.get('entry', [{}])[0]
-            changes = entry.get('changes', [{}])[0]
-            value = changes.get('value', {})
-            
-            if 'messages' not in value:
-                return None
-            
-            messages = value.get('messages', [])
-            if not messages:
-                return None
-            
-            message = messages[0]
-            contacts = value.get('contacts', [{}])[0]
+            value = data['entry'][0]['changes'][0]['value']
+            message = value['messages'][0]
             
-            if message.get('type') != 'text':
+            if message['type'] != 'text':
                 return None
             
             return {
-                "from": contacts.get('wa_id', ''),
-                "body": message.get('text', {}).get('body', ''),
-                "to": value.get('metadata', {}).get('phone_number_id', '')
+                "from": value['contacts'][0]['wa_id'],
+                "body": message['text']['body'],
+                "to": value['metadata']['phone_number_id']
             }
             
-        except Exception as e:
-            logger.error(f"Error parsing WhatsApp Business message: {e}")
+        except (KeyError, IndexError, TypeError):
             return None
     
     def _process_message(self, message_data: Dict):
@@ -206,7 +358,7 @@ class WhatsAppBridge:
         from_number = message_data["from"]
         body = message_data["body"]
         
-        logger.info(f"Processing message from {from_number}: {body[:50]}...")
+        logger.info("Processing message from %s: %.50s...", from_number, body)
         
         try:
             # Simple command parsing
@@ -220,46 +372,44 @@ class WhatsAppBridge:
             self._send_response(from_number, response)
             
         except Exception as e:
-            logger.error(f"Error processing message: {e}")
+            logger.error("Error processing message: %s", e)
             self._send_response(from_number, "Sorry, an error occurred. Please try again.")
     
     def _handle_command(self, command: str, user_id: str) -> str:
         """Handle command"""
-        parts = command[1:].split()
-        cmd = parts[0].lower()
-        args = parts[1:]
+        # Split off the command name only; most commands ignore the rest
+        parts = command[1:].split(None, 1)
+        cmd = parts[0].lower() if parts else ""
+        rest = parts[1] if len(parts) > 1 else ""
         
-        if cmd == "help":
-            return """
-🤖 *Memory Bot Commands*
-
-*!help* - Show this help
-*!chat <message>* - Chat with AI
-*!clear* - Clear session
-*!session info* - Show session info
-
-Or just send a message to chat directly!
-"""
-        
-        elif cmd == "chat":
-            if not args:
-                return "Please provide a message. Usage: *!chat <message>*"
-            return self._handle_chat(" ".join(args), user_id)
-        
-        elif cmd == "clear":
-            if user_id in self.user_sessions:
-                del self.user_sessions[user_id]
-                return "✅ Session cleared. Starting fresh!"
-            return "No active session to clear."
-        
-        elif cmd == "session":
-            session_id = self.user_sessions.get(user_id)
-            if session_id:
-                return f"📋 *Session Info*\nSession ID: `{session_id}`"
-            return "No active session. Start chatting to create one!"
-        
-        else:
-            return f"Unknown command: *{cmd}*. Type *!help* for available commands."
+        name = self._HANDLERS.get(cmd)
+        if name is None:
+            return _UNKNOWN_FMT.format(cmd)
+        return getattr(self, name)(rest, user_id)
+    
+    def _cmd_help(self, args: str, user_id: str) -> str:
+        """Handle !help"""
+        return _HELP_TEXT
+    
+    def _cmd_chat(self, args: str, user_id: str) -> str:
+        """Handle !chat <message>"""
+        words = args.split()
+        if not words:
+            return "Please provide a message. Usage: *!chat <message>*"
+        return self._handle_chat(" ".join(words), user_id)
+    
+    def _cmd_clear(self, args: str, user_id: str) -> str:
+        """Handle !clear"""
+        if self.user_sessions.pop(user_id) is not None:
+            return "✅ Session cleared. Starting fresh!"
+        return "No active session to clear."
+    
+    def _cmd_session(self, args: str, user_id: str) -> str:
+        """Handle !session"""
+        session_id = self.user_sessions.get(user_id)
+        if session_id:
+            return f"📋 *Session Info*\nSession ID: `{session_id}`"
+        return "No active session. Start chatting to create one!"
     
     def _handle_chat(self, message: str, user_id: str) -> str:
         """Handle chat with AI"""
@@ -278,14 +428,14 @@ Or just send a message to chat directly!
             return response["content"]
             
         except Exception as e:
-            logger.error(f"Error in chat: {e}")
+            logger.error("Error in chat: %s", e)
             return "Sorry, I couldn't process your message. Please try again."
     
     def _send_response(self, to: str, response: str):
         """Send response back to user"""
         # This would be implemented based on your provider
         # For now, just log it
-        logger.info(f"Response to {to}: {response[:100]}...")
+        logger.info("Response to %s: %.100s...", to, response)
         
         # In a real implementation, you would:
         # 1. Split long messages if needed
@@ -294,8 +444,13 @@ Or just send a message to chat directly!
     
     def start(self, host: str = "0.0.0.0", port: int = 5000, debug: bool = False):
         """Start the bridge server"""
-        logger.info(f"Starting WhatsApp Bridge on {host}:{port}")
-        self.app.run(host=host, port=port, debug=debug)
+        logger.info("Starting WhatsApp Bridge on %s:%s", host, port)
+        uvicorn.run(
+            self.app,
+            host=host,
+            port=port,
+            log_level="debug" if debug else "info"
+        )
 
 
 # Simple standalone runner
@@ -12,13 +12,28 @@ Usage:
 """
 
 import os
-import sys
 import json
-import time
+import fcntl
+import asyncio
+import shutil
+import hashlib
+import signal
+import socket
+import struct
+import inspect
 import logging
 import subprocess
+from collections import deque
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any, Optional, Callable
+from string import Template
+from typing import Deque, Dict, Any, List, Optional, Callable, Sequence, Set, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
 
 # 配置日志
 logging.basicConfig(
@@ -27,6 +42,186 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 单行日志输出上限
+STREAM_LIMIT = 1 << 20
+
+# 事件帧：4 字节大端长度前缀 + JSON 负载
+FRAME_HEADER_SIZE = 4
+MAX_FRAME_SIZE = 16 << 20
+
+# 事件 socket：等待 Node.js 创建的时间、接收缓冲区大小
+SOCKET_CONNECT_TIMEOUT = 30
+SOCKET_BUFFER_SIZE = 1 << 20
+
+# 事件队列上限（处理器跟不上时读取任务等待）
+EVENT_QUEUE_SIZE = 1024
+
+# 同时处理的消息数上限（不同联系人之间）
+MAX_CONCURRENT_DISPATCH = 5
+
+# 已取出但尚未处理完的消息数上限（含等待同一联系人前序消息的任务）
+MAX_PENDING_DISPATCH = 64
+
+# 系统 Chromium 可执行文件名（找到时不下载 Puppeteer 自带的 Chromium）
+CHROMIUM_NAMES = ('chromium', 'chromium-browser', 'google-chrome', 'google-chrome-stable')
+
+# 从其他线程断开连接时的等待时间（秒）
+SHUTDOWN_TIMEOUT = 5
+
+# Bridge 进程的 V8 堆设置：固定上限，加大新生代以减少 GC 停顿
+BRIDGE_NODE_OPTIONS = '--max-old-space-size=512 --max-semi-space-size=64'
+
+# Bridge 脚本模板
+BRIDGE_TEMPLATE_PATH = Path(__file__).parent / "templates" / "whatsapp-bridge.js.tmpl"
+
+# Chromium 启动参数：单进程、无 JIT，降低每个会话的内存占用
+DEFAULT_PUPPETEER_ARGS = (
+    '--no-sandbox',
+    '--single-process',
+    '--no-zygote',
+    '--disable-gpu',
+    '--disable-dev-shm-usage',
+    '--js-flags=--jitless',
+    '--renderer-process-limit=1',
+)
+
+# 依赖安装超时（秒）
+INSTALL_TIMEOUT = 300
+
+# 安装失败时输出的日志行数
+INSTALL_OUTPUT_TAIL = 200
+
+# 环境检查结果缓存文件（位于会话目录）
+CHECK_CACHE_FILE = ".check_cache.json"
+
+# 生成文件的内容哈希记录（位于会话目录）
+CONTENT_HASHES_FILE = ".content-hashes"
+
+# Bridge 主进程的启动锁和日志文件（位于会话目录）
+BRIDGE_LOCK_FILE = "bridge.lock"
+BRIDGE_LOG_FILE = "bridge.log"
+
+
+def _mtime(path: Optional[Path]) -> Optional[float]:
+    """返回文件修改时间，不存在时返回 None"""
+    try:
+        return path.stat().st_mtime if path else None
+    except OSError:
+        return None
+
+
+@lru_cache(maxsize=1)
+def _nodejs_version() -> Optional[str]:
+    """返回 Node.js 版本（进程内缓存）"""
+    try:
+        result = subprocess.run(
+            ['node', '--version'],
+            capture_output=True,
+            text=True,
+            timeout=10
+        )
+        if result.returncode == 0:
+            return result.stdout.strip()
+    except Exception as e:
+        logger.debug("检查 Node.js 失败: %s", e)
+    return None
+
+
+@lru_cache(maxsize=1)
+def _whatsapp_web_js_installed(project_dir: Path) -> bool:
+    """检查 whatsapp-web.js 是否安装（进程内缓存）"""
+    return (project_dir / "node_modules" / "whatsapp-web.js").exists()
+
+
+def _chromium_env() -> Dict[str, str]:
+    """返回使用系统 Chromium 所需的环境变量（未找到时为空）"""
+    executable = os.environ.get('PUPPETEER_EXECUTABLE_PATH')
+    if not executable:
+        executable = next(filter(None, map(shutil.which, CHROMIUM_NAMES)), None)
+    if not executable:
+        return {}
+    return {
+        'PUPPETEER_EXECUTABLE_PATH': executable,
+        'PUPPETEER_SKIP_CHROMIUM_DOWNLOAD': '1',
+        'PUPPETEER_SKIP_DOWNLOAD': '1',
+    }
+
+
+def _batch_scheduling(pid: int):
+    """把进程切换到 SCHED_BATCH 调度（不支持时忽略）
+    
+    在父进程中调用：preexec_fn 在有线程的父进程里 fork 后执行并不安全。
+    之后由它启动的 Chromium 进程会继承该调度策略。
+    """
+    if not hasattr(os, 'SCHED_BATCH'):
+        return
+    try:
+        os.sched_setscheduler(pid, os.SCHED_BATCH, os.sched_param(0))
+    except OSError as e:
+        logger.debug("设置 SCHED_BATCH 失败: %s", e)
+
+
+class _BridgeTemplate(Template):
+    """使用 {{ name }} 占位符的模板（JS 模板字符串本身使用 ${...}）"""
+    
+    pattern = r"""
+    \{\{\s*(?:
+        (?P<named>[_a-z][_a-z0-9]*)\s*\}\} |
+        (?P<braced>(?!)) |
+        (?P<escaped>(?!)) |
+        (?P<invalid>)
+    )
+    """
+
+
+@lru_cache(maxsize=1)
+def _bridge_template() -> _BridgeTemplate:
+    """读取 Bridge 脚本模板（进程内只读取一次）"""
+    return _BridgeTemplate(BRIDGE_TEMPLATE_PATH.read_text(encoding='utf-8'))
+
+
+@lru_cache(maxsize=8)
+def _render_bridge_script(headless: bool, puppeteer_args: Tuple[str, ...]) -> str:
+    """渲染 Bridge 脚本（相同参数只渲染一次）"""
+    return _bridge_template().substitute(
+        headless=json.dumps(headless),
+        puppeteer_args=',\n'.join(' ' * 16 + _js_string(arg) for arg in puppeteer_args),
+    )
+
+
+def _js_string(value: str) -> str:
+    """转成单引号 JS 字符串字面量"""
+    return "'" + json.dumps(value)[1:-1].replace("'", "\\'") + "'"
+
+
+def _loads(data: bytes) -> Any:
+    """解析 JSON（有 orjson 时使用 orjson）"""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _dumps(obj: Any) -> bytes:
+    """序列化为紧凑 JSON（有 orjson 时使用 orjson）"""
+    return orjson.dumps(obj) if orjson is not None else json.dumps(obj).encode()
+
+
+def _dumps_pretty(obj: Any) -> str:
+    """序列化为缩进 2 格的 JSON 文本"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
+
+def _encode_frame(message: Dict) -> bytes:
+    """编码发往 Bridge 的命令帧（4 字节大端长度 + JSON）"""
+    payload = _dumps(message)
+    return len(payload).to_bytes(FRAME_HEADER_SIZE, 'big') + payload
+
+
+def clear_check_cache():
+    """清除进程内的环境检查缓存"""
+    _nodejs_version.cache_clear()
+    _whatsapp_web_js_installed.cache_clear()
+
 
 class WhatsAppWebClient:
     """
@@ -35,77 +230,210 @@ class WhatsAppWebClient:
     使用 Node.js + whatsapp-web.js 实现，类似 OpenClaw 的方式。
     """
     
-    def __init__(self, session_name: str = "memory-bot-session"):
+    def __init__(
+        self,
+        session_name: str = "memory-bot-session",
+        headless: bool = True,
+        extra_puppeteer_args: Sequence[str] = ()
+    ):
         self.session_name = session_name
+        # 浏览器参数写入生成的脚本，由启动 Bridge 主进程的客户端决定
+        self.headless = headless
+        self.puppeteer_args = DEFAULT_PUPPETEER_ARGS + tuple(extra_puppeteer_args)
         self.connected = False
         self.qr_code: Optional[str] = None
         self.user_info: Optional[Dict] = None
         self.message_handlers: List[Callable] = []
+        # 仅由启动了 Bridge 主进程的客户端持有
+        self.node_process: Optional[subprocess.Popen] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event_reader: Optional[asyncio.StreamReader] = None
+        self._event_writer: Optional[asyncio.StreamWriter] = None
+        self._consumer_tasks: List[asyncio.Task] = []
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatch_tasks: Set[asyncio.Task] = set()
+        # 同一联系人的消息按顺序处理，不同联系人并发处理（总数受限）
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+        self._session_lock_refs: Dict[str, int] = {}
+        self._sem: Optional[asyncio.Semaphore] = None
+        # 限制在途分发任务数，使队列上限真正形成背压
+        self._pending: Optional[asyncio.Semaphore] = None
+        # 请求断开后 wait_closed 不再等待剩余事件
+        self._closing = asyncio.Event()
         
         # 项目目录
         self.project_dir = Path(__file__).parent
         self.session_dir = self.project_dir / "whatsapp-sessions"
         self.session_dir.mkdir(exist_ok=True)
+        self.socket_path = self.session_dir / "bridge.sock"
         
-        logger.info(f"📱 WhatsApp Web 客户端初始化")
-        logger.info(f"   会话名称: {session_name}")
-        logger.info(f"   会话目录: {self.session_dir}")
+        logger.info("📱 WhatsApp Web 客户端初始化")
+        logger.info("   会话名称: %s", session_name)
+        logger.info("   会话目录: %s", self.session_dir)
     
     def on_message(self, handler: Callable[[Dict], None]):
         """注册消息处理器"""
         self.message_handlers.append(handler)
-        logger.info(f"✅ 已注册消息处理器: {handler.__name__}")
+        logger.info("✅ 已注册消息处理器: %s", handler.__name__)
     
-    def connect(self):
+    def connect(self) -> bool:
         """
-        连接到 WhatsApp Web
+        连接到 WhatsApp Web（阻塞，直到 Node.js 进程退出）
         
         首次连接会显示二维码，需要用手机扫描。
         """
+        return asyncio.run(self._run())
+    
+    async def _run(self) -> bool:
+        """连接并等待 Node.js 进程结束"""
+        if not await self.connect_async():
+            return False
+        try:
+            await self.wait_closed()
+        finally:
+            await self.disconnect_async()
+        return True
+    
+    async def wait_closed(self):
+        """
+        等待事件 socket 关闭，并处理完已排队的事件
+        
+        请求断开后消费者任务已停止，不再等待剩余事件，立即返回。
+        """
+        if self._reader_task and not await self._unless_closing(self._reader_task):
+            return
+        if self._queue and not await self._unless_closing(self._queue.join()):
+            return
+        if self._dispatch_tasks:
+            await self._unless_closing(asyncio.wait(self._dispatch_tasks))
+    
+    async def _unless_closing(self, aw) -> bool:
+        """等待 aw 完成；先请求了断开时放弃等待并返回 False"""
+        if self._closing.is_set():
+            return False
+        task = asyncio.ensure_future(aw)
+        closing = asyncio.create_task(self._closing.wait())
+        try:
+            await asyncio.wait({task, closing}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            closing.cancel()
+        if self._closing.is_set():
+            task.cancel()
+            return False
+        task.result()
+        return True
+    
+    async def connect_async(self) -> bool:
+        """
+        连接到 WhatsApp Web（非阻塞）
+        
+        启动 Node.js 进程和后台输出读取任务后立即返回，
+        事件循环可以继续并发执行消息处理器。
+        """
         logger.info("🚀 开始连接 WhatsApp Web...")
+        self._loop = asyncio.get_running_loop()
+        
+        # 磁盘缓存每次连接只读取一次
+        cached = self._read_check_cache()
         
         # 检查 Node.js 环境
-        if not self._check_nodejs():
+        if not self._check_nodejs(cached):
             logger.error("❌ 未安装 Node.js，请先安装 Node.js 14+")
             logger.info("   安装指南: https://nodejs.org/")
             return False
         
         # 检查 whatsapp-web.js
-        if not self._check_whatsapp_web_js():
+        if not self._check_whatsapp_web_js(cached):
             logger.info("📦 安装 whatsapp-web.js...")
-            self._install_whatsapp_web_js()
+            await self._install_whatsapp_web_js()
+        
+        if not cached and self._check_whatsapp_web_js(cached):
+            self._write_check_cache()
         
         # 创建 Node.js 脚本
         self._create_node_script()
         
         # 启动连接
-        self._start_connection()
+        await self._start_connection()
         
         return True
     
-    def _check_nodejs(self) -> bool:
-        """检查 Node.js 环境"""
-        try:
-            result = subprocess.run(
-                ['node', '--version'],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            if result.returncode == 0:
-                version = result.stdout.strip()
-                logger.info(f"✅ Node.js 已安装: {version}")
-                return True
-        except Exception as e:
-            logger.debug(f"检查 Node.js 失败: {e}")
+    def _check_nodejs(self, cached: Dict[str, Any]) -> bool:
+        """检查 Node.js 环境（cached 为 _read_check_cache 的结果）"""
+        version = cached.get("node_version") or _nodejs_version()
+        if version:
+            logger.info("✅ Node.js 已安装: %s", version)
+            return True
         return False
     
-    def _check_whatsapp_web_js(self) -> bool:
-        """检查 whatsapp-web.js 是否安装"""
-        node_modules = self.project_dir / "node_modules" / "whatsapp-web.js"
-        return node_modules.exists()
+    def _check_whatsapp_web_js(self, cached: Dict[str, Any]) -> bool:
+        """检查 whatsapp-web.js 是否安装（cached 为 _read_check_cache 的结果）"""
+        if cached.get("whatsapp_web_js"):
+            return True
+        return _whatsapp_web_js_installed(self.project_dir)
+    
+    def _check_stamps(self) -> Dict[str, Any]:
+        """环境检查缓存的有效性标记（node 可执行文件、package.json、node_modules）"""
+        node_path = shutil.which('node')
+        return {
+            "node_path": node_path,
+            "node_mtime": _mtime(Path(node_path) if node_path else None),
+            "package_json_mtime": _mtime(self.project_dir / "package.json"),
+            "node_modules_mtime": _mtime(self.project_dir / "node_modules"),
+        }
+    
+    def _read_check_cache(self) -> Dict[str, Any]:
+        """读取磁盘上的检查结果，标记不匹配时视为失效"""
+        try:
+            with open(self.session_dir / CHECK_CACHE_FILE) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(cached, dict) or cached.get("stamps") != self._check_stamps():
+            return {}
+        return cached
+    
+    def _write_check_cache(self):
+        """把通过的检查结果写入磁盘，供进程重启后使用"""
+        try:
+            with open(self.session_dir / CHECK_CACHE_FILE, 'w') as f:
+                json.dump({
+                    "node_version": _nodejs_version(),
+                    "whatsapp_web_js": True,
+                    "stamps": self._check_stamps(),
+                }, f)
+        except OSError as e:
+            logger.debug("写入检查缓存失败: %s", e)
     
-    def _install_whatsapp_web_js(self):
+    def invalidate_check_cache(self):
+        """清除内存和磁盘上的环境检查结果"""
+        clear_check_cache()
+        (self.session_dir / CHECK_CACHE_FILE).unlink(missing_ok=True)
+    
+    def _install_command(self) -> List[str]:
+        """选择安装命令：优先 pnpm，有锁文件时按锁文件严格安装"""
+        if shutil.which('pnpm'):
+            if (self.project_dir / "pnpm-lock.yaml").exists():
+                return ['pnpm', 'install', '--frozen-lockfile', '--prefer-offline']
+            return ['pnpm', 'install', '--prefer-offline']
+        if (self.project_dir / "package-lock.json").exists():
+            return ['npm', 'ci', '--prefer-offline', '--no-audit', '--no-fund']
+        return ['npm', 'install', '--prefer-offline', '--no-audit', '--no-fund']
+    
+    async def _log_install_output(self, process: asyncio.subprocess.Process, tail: Deque[bytes]):
+        """把安装输出逐行写入日志，只保留最后若干行，并等待进程结束"""
+        debug = logger.isEnabledFor(logging.DEBUG)
+        while True:
+            raw = await process.stdout.readline()
+            if not raw:
+                break
+            tail.append(raw)
+            if debug:
+                logger.debug("   %s", raw.decode(errors='replace').rstrip())
+        await process.wait()
+    
+    async def _install_whatsapp_web_js(self):
         """安装 whatsapp-web.js"""
         try:
             logger.info("📦 正在安装 whatsapp-web.js...")
@@ -113,218 +441,386 @@ class WhatsAppWebClient:
             # 创建 package.json
             package_json = self.project_dir / "package.json"
             if not package_json.exists():
-                with open(package_json, 'w') as f:
-                    json.dump({
-                        "name": "memory-bot-whatsapp",
-                        "version": "1.0.0",
-                        "dependencies": {
-                            "whatsapp-web.js": "^1.23.0",
-                            "qrcode-terminal": "^0.12.0"
-                        }
-                    }, f, indent=2)
+                self._write_if_changed(package_json, _dumps_pretty({
+                    "name": "memory-bot-whatsapp",
+                    "version": "1.0.0",
+                    "dependencies": {
+                        "whatsapp-web.js": "^1.23.0",
+                        "qrcode-terminal": "^0.12.0",
+                        "redis": "^4.6.0"
+                    }
+                }))
             
-            # 安装依赖
-            subprocess.run(
-                ['npm', 'install'],
+            # 安装依赖，输出逐行写入日志
+            command = self._install_command()
+            logger.info("   执行: %s", ' '.join(command))
+            process = await asyncio.create_subprocess_exec(
+                *command,
                 cwd=self.project_dir,
-                capture_output=True,
-                text=True,
-                timeout=300
+                env={
+                    **os.environ,
+                    **_chromium_env(),
+                    'NPM_CONFIG_AUDIT': 'false',
+                    'NPM_CONFIG_FUND': 'false',
+                },
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                limit=STREAM_LIMIT
             )
+            tail: Deque[bytes] = deque(maxlen=INSTALL_OUTPUT_TAIL)
+            try:
+                await asyncio.wait_for(
+                    self._log_install_output(process, tail), INSTALL_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise
+            if process.returncode != 0:
+                # 失败时才输出最后的安装日志
+                logger.error(
+                    "❌ %s 安装输出（最后 %d 行）:\n%s",
+                    command[0], len(tail),
+                    b''.join(tail).decode(errors='replace').rstrip()
+                )
+                raise RuntimeError(f"{command[0]} 退出码 {process.returncode}")
             
+            _whatsapp_web_js_installed.cache_clear()
             logger.info("✅ whatsapp-web.js 安装完成")
             
         except Exception as e:
-            logger.error(f"❌ 安装 whatsapp-web.js 失败: {e}")
+            logger.error("❌ 安装 whatsapp-web.js 失败: %s", e)
             raise
     
     def _create_node_script(self):
-        """创建 Node.js 脚本"""
+        """根据模板生成 Node.js 脚本（内容不变时不写入）"""
         script_path = self.project_dir / "whatsapp-bridge.js"
+        script_content = _render_bridge_script(self.headless, self.puppeteer_args)
         
-        script_content = '''
-const { Client, LocalAuth } = require('whatsapp-web.js');
-const qrcode = require('qrcode-terminal');
-const fs = require('fs');
-const path = require('path');
-
-// 配置
-const SESSION_NAME = process.env.WHATSAPP_SESSION_NAME || 'memory-bot-session';
-const SESSION_DIR = path.join(__dirname, 'whatsapp-sessions');
-
-// 确保会话目录存在
-if (!fs.existsSync(SESSION_DIR)) {
-    fs.mkdirSync(SESSION_DIR, { recursive: true });
-}
-
-// 创建客户端
-const client = new Client({
-    authStrategy: new LocalAuth({
-        dataPath: SESSION_DIR,
-        clientId: SESSION_NAME
-    }),
-    puppeteer: {
-        headless: true,
-        args: ['--no-sandbox', '--disable-setuid-sandbox']
-    }
-});
-
-// 生成二维码
-client.on('qr', (qr) => {
-    console.log('\\n🔐 请扫描二维码以登录 WhatsApp Web:');
-    qrcode.generate(qr, { small: true });
-    console.log('\\n📱 扫描方法:');
-    console.log('   1. 打开手机 WhatsApp');
-    console.log('   2. 设置 → 已连接的设备 → 连接设备');
-    console.log('   3. 扫描二维码\\n');
-});
-
-// 认证成功
-client.on('authenticated', () => {
-    console.log('✅ WhatsApp 认证成功！');
-});
-
-// 认证失败
-client.on('auth_failure', (msg) => {
-    console.error('❌ 认证失败:', msg);
-});
-
-// 就绪
-client.on('ready', () => {
-    console.log('🚀 WhatsApp Bot 已就绪！');
-    console.log('   等待接收消息...');
-    console.log('   按 Ctrl+C 退出\\n');
-});
-
-// 接收消息
-client.on('message', async (msg) => {
-    console.log(`📩 收到消息来自 ${msg.from}: ${msg.body}`);
-    
-    // 忽略自己的消息
-    if (msg.fromMe) return;
-    
-    // 忽略群组消息（可选）
-    if (msg.from.includes('@g.us')) {
-        console.log('   忽略群组消息');
-        return;
-    }
+        if self._write_if_changed(script_path, script_content):
+            logger.info("✅ Node.js 脚本已创建: %s", script_path)
     
-    // 处理消息
-    const response = await processMessage(msg.body, msg.from);
-    
-    // 发送回复
-    await msg.reply(response);
-    console.log(`📤 回复: ${response.substring(0, 100)}...`);
-});
-
-// 断开连接
-client.on('disconnected', (reason) => {
-    console.log('⚠️  WhatsApp 断开连接:', reason);
-});
-
-// 处理消息
-async function processMessage(message, from) {
-    // 简单命令处理
-    if (message.startsWith('!')) {
-        const parts = message.slice(1).split(' ');
-        const cmd = parts[0].toLowerCase();
-        const args = parts.slice(1);
+    def _write_if_changed(self, path: Path, content: str) -> bool:
+        """
+        内容变化时才写入文件
         
-        switch (cmd) {
-            case 'help':
-                return `🤖 *Memory Bot 帮助*
-
-*!help* - 显示帮助
-*!chat <消息>* - 和 AI 聊天
-*!clear* - 清除会话
-*!info* - 显示会话信息
-
-或直接发送消息聊天！`;
+        内容哈希记录在会话目录的 .content-hashes 中；文件大小和修改时间
+        与记录一致时直接跳过，无需重新读取文件。
+        
+        Returns:
+            是否写入了文件
+        """
+        data = content.encode('utf-8')
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        hashes_path = self.session_dir / CONTENT_HASHES_FILE
+        try:
+            with open(hashes_path) as f:
+                hashes = json.load(f)
+        except (OSError, ValueError):
+            hashes = {}
+        
+        key = str(path)
+        try:
+            stat = path.stat()
+        except OSError:
+            stat = None
+        
+        if stat is not None:
+            recorded = hashes.get(key)
+            if recorded == [digest, stat.st_size, stat.st_mtime_ns]:
+                return False
+            # 没有记录或记录过期：读取文件比较
+            if hashlib.blake2b(path.read_bytes(), digest_size=16).hexdigest() == digest:
+                hashes[key] = [digest, stat.st_size, stat.st_mtime_ns]
+                self._save_content_hashes(hashes_path, hashes)
+                return False
+        
+        path.write_bytes(data)
+        stat = path.stat()
+        hashes[key] = [digest, stat.st_size, stat.st_mtime_ns]
+        self._save_content_hashes(hashes_path, hashes)
+        return True
+    
+    def _save_content_hashes(self, hashes_path: Path, hashes: Dict[str, Any]):
+        """保存内容哈希记录"""
+        try:
+            with open(hashes_path, 'w') as f:
+                json.dump(hashes, f)
+        except OSError as e:
+            logger.debug("写入内容哈希失败: %s", e)
+    
+    async def _start_connection(self):
+        """
+        启动连接
+        
+        同一项目目录下的所有会话共享一个 Bridge 主进程：已有主进程在运行时
+        直接接入，否则启动一个新的主进程（由文件锁保证只启动一个）。主进程
+        独立于启动它的客户端运行，最后一个会话关闭时自行退出。
+        """
+        try:
+            # 读取任务（生产者）把事件放入队列，消费者任务分发给处理器
+            self._queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+            self._sem = asyncio.Semaphore(MAX_CONCURRENT_DISPATCH)
+            self._pending = asyncio.Semaphore(MAX_PENDING_DISPATCH)
+            self._closing = asyncio.Event()
+            self._consumer_tasks = [
+                asyncio.create_task(self._consume_events())
+                for _ in range(os.cpu_count() or 1)
+            ]
             
-            case 'chat':
-                if (args.length === 0) {
-                    return '请提供消息内容。用法: *!chat <消息>*';
-                }
-                return `💬 你说: ${args.join(' ')}\\n\\n[AI 回复将在这里]';
+            try:
+                self._event_reader = await self._open_event_socket()
+                logger.info("🔗 接入已运行的 WhatsApp Bridge")
+            except (FileNotFoundError, ConnectionRefusedError):
+                async with self._spawn_lock():
+                    try:
+                        # 等锁期间其他客户端可能已经启动了主进程
+                        self._event_reader = await self._open_event_socket()
+                        logger.info("🔗 接入已运行的 WhatsApp Bridge")
+                    except (FileNotFoundError, ConnectionRefusedError):
+                        self._spawn_bridge()
+                        self._event_reader = await self._wait_event_socket()
             
-            case 'clear':
-                return '✅ 会话已清除。开始新的对话！';
+            # 接入本客户端的会话
+            self._event_writer.write(_encode_frame({
+                "cmd": "attach",
+                "session": self.session_name,
+            }))
+            await self._event_writer.drain()
+            logger.info("   等待二维码扫描...")
             
-            case 'info':
-                return '📋 *会话信息*\\n会话 ID: [会话 ID 将在这里]';
+            self._reader_task = asyncio.create_task(self._read_events())
             
-            default:
-                return `未知命令: *${cmd}*。输入 *!help* 查看可用命令。`;
-        }
-    }
+        except Exception as e:
+            logger.error("❌ 启动失败: %s", e)
+            raise
     
-    // 普通消息
-    return `收到你的消息: *${message}*\\n\\n我是 Memory Bot，一个会记住事情的 AI 助手。有什么可以帮你的吗？`;
-}
-
-// 启动客户端
-console.log('🚀 启动 WhatsApp Bridge...');
-client.initialize();
-
-// 处理退出
-process.on('SIGINT', async () => {
-    console.log('\\n🛑 正在关闭...');
-    await client.destroy();
-    process.exit(0);
-});
-'''
-        
-        with open(script_path, 'w') as f:
-            f.write(script_content)
-        
-        logger.info(f"✅ Node.js 脚本已创建: {script_path}")
+    @asynccontextmanager
+    async def _spawn_lock(self):
+        """持有启动锁（跨进程），避免同时启动多个主进程"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SOCKET_CONNECT_TIMEOUT
+        with open(self.session_dir / BRIDGE_LOCK_FILE, 'w') as lock_file:
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if loop.time() > deadline:
+                        raise TimeoutError("等待 Bridge 启动锁超时")
+                    await asyncio.sleep(0.05)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
     
-    def _start_connection(self):
-        """启动连接"""
+    def _spawn_bridge(self):
+        """启动 Bridge 主进程"""
         logger.info("🚀 启动 WhatsApp Bridge...")
+        log_path = self.session_dir / BRIDGE_LOG_FILE
         
-        try:
-            # 启动 Node.js 进程
+        # 事件走 Unix socket，日志写入文件；使用独立会话，
+        # 启动它的客户端退出（或收到 Ctrl+C）时主进程继续为其他会话服务
+        with open(log_path, 'ab') as log_file:
             self.node_process = subprocess.Popen(
                 ['node', 'whatsapp-bridge.js'],
                 cwd=self.project_dir,
-                stdout=subprocess.PIPE,
+                stdin=subprocess.DEVNULL,
+                stdout=log_file,
                 stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
+                env={
+                    **os.environ,
+                    **_chromium_env(),
+                    # 用户设置的 NODE_OPTIONS 放在后面，可以覆盖默认值
+                    'NODE_OPTIONS': f"{BRIDGE_NODE_OPTIONS} {os.environ.get('NODE_OPTIONS', '')}".strip(),
+                    'WHATSAPP_BRIDGE_SOCKET': str(self.socket_path),
+                },
+                start_new_session=True
             )
+        _batch_scheduling(self.node_process.pid)
+        logger.info("✅ WhatsApp Bridge 已启动，日志: %s", log_path)
+    
+    async def _wait_event_socket(self) -> asyncio.StreamReader:
+        """等待新启动的 Bridge 创建事件 socket 并连接"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SOCKET_CONNECT_TIMEOUT
+        while True:
+            try:
+                return await self._open_event_socket()
+            except (FileNotFoundError, ConnectionRefusedError):
+                if self.node_process.poll() is not None:
+                    raise RuntimeError(
+                        f"WhatsApp Bridge 进程已退出，日志: {self.session_dir / BRIDGE_LOG_FILE}"
+                    )
+                if loop.time() > deadline:
+                    raise TimeoutError(f"连接事件 socket 超时: {self.socket_path}")
+                await asyncio.sleep(0.05)
+    
+    async def _open_event_socket(self) -> asyncio.StreamReader:
+        """连接 Bridge 的事件 socket"""
+        reader, writer = await asyncio.open_unix_connection(
+            str(self.socket_path), limit=STREAM_LIMIT
+        )
+        
+        sock = writer.get_extra_info('socket')
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+        
+        # 只接受同一用户的进程
+        if hasattr(socket, 'SO_PEERCRED'):
+            creds = sock.getsockopt(
+                socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')
+            )
+            _, uid, _ = struct.unpack('3i', creds)
+            if uid != os.getuid():
+                writer.close()
+                raise PermissionError(f"事件 socket 属于其他用户 (uid={uid})")
+        
+        self._event_writer = writer
+        return reader
+    
+    async def _read_events(self):
+        """读取事件 socket 上的事件帧（4 字节大端长度 + JSON）"""
+        reader = self._event_reader
+        while True:
+            try:
+                header = await reader.readexactly(FRAME_HEADER_SIZE)
+                length = int.from_bytes(header, 'big')
+                if length > MAX_FRAME_SIZE:
+                    logger.error("❌ 事件帧过大: %d 字节", length)
+                    break
+                payload = await reader.readexactly(length)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
             
-            logger.info("✅ WhatsApp Bridge 已启动")
-            logger.info("   等待二维码扫描...")
-            
-            # 读取输出
-            for line in self.node_process.stdout:
-                line = line.strip()
-                if line:
-                    print(line)
-                    
-                    # 检测就绪状态
-                    if "已就绪" in line or "ready" in line.lower():
-                        self.connected = True
-                        logger.info("🎉 WhatsApp 连接成功！")
-                    
-                    # 检测二维码
-                    if "二维码" in line or "QR" in line:
-                        logger.info("📱 请扫描二维码登录")
-            
+            try:
+                event = _loads(payload)
+            except ValueError:
+                logger.warning("⚠️  无法解析事件帧")
+                continue
+            if not isinstance(event, dict):
+                continue
+            if event.get("type") == "message":
+                # 队列已满时在此等待，形成背压
+                await self._queue.put(event)
+            else:
+                self._handle_status(event)
+    
+    def _handle_status(self, event: Dict):
+        """处理连接状态事件（二维码、就绪、认证失败、断开）"""
+        event_type = event.get("type")
+        if event_type == "qr":
+            self.qr_code = event.get("qr")
+            # 二维码由本客户端显示，接入已运行的主进程时同样可以扫描
+            print("\n🔐 请扫描二维码以登录 WhatsApp Web:")
+            print(event.get("art", ""))
+            print("\n📱 扫描方法:")
+            print("   1. 打开手机 WhatsApp")
+            print("   2. 设置 → 已连接的设备 → 连接设备")
+            print("   3. 扫描二维码\n")
+        elif event_type == "ready":
+            self.connected = True
+            self.qr_code = None
+            self.user_info = event.get("user")
+            logger.info("🎉 WhatsApp 连接成功！")
+        elif event_type == "auth_failure":
+            logger.error("❌ 认证失败: %s", event.get("message"))
+        elif event_type == "disconnected":
+            self.connected = False
+            logger.warning("⚠️  WhatsApp 断开连接: %s", event.get("reason"))
+    
+    async def _consume_events(self):
+        """从队列取出 Node.js 事件并分发给消息处理器"""
+        while True:
+            event = await self._queue.get()
+            try:
+                if event.get("type") == "message":
+                    # 在途任务满时不再取事件，队列填满后读取任务随之等待
+                    await self._pending.acquire()
+                    task = asyncio.create_task(self._dispatch(event))
+                    self._dispatch_tasks.add(task)
+                    task.add_done_callback(self._dispatch_done)
+            finally:
+                self._queue.task_done()
+    
+    def _dispatch_done(self, task: asyncio.Task):
+        """分发任务结束：释放在途名额"""
+        self._dispatch_tasks.discard(task)
+        self._pending.release()
+    
+    async def _dispatch(self, message: Dict):
+        """按发送者串行、跨发送者并发地执行消息处理器"""
+        sender = message.get("from", "")
+        lock = self._session_locks.get(sender)
+        if lock is None:
+            lock = self._session_locks[sender] = asyncio.Lock()
+        self._session_lock_refs[sender] = self._session_lock_refs.get(sender, 0) + 1
+        
+        try:
+            # 先排队等同一联系人的前序消息，再占用并发名额，
+            # 避免某个联系人的积压消息占满名额阻塞其他联系人
+            async with lock:
+                async with self._sem:
+                    for handler in self.message_handlers:
+                        await self._run_handler(handler, message)
+        finally:
+            # 没有其他任务在使用时清理该发送者的锁
+            self._session_lock_refs[sender] -= 1
+            if not self._session_lock_refs[sender]:
+                del self._session_lock_refs[sender]
+                del self._session_locks[sender]
+    
+    async def _run_handler(self, handler: Callable, message: Dict):
+        """执行消息处理器（支持同步和异步处理器）"""
+        try:
+            result = handler(message)
+            if inspect.isawaitable(result):
+                await result
         except Exception as e:
-            logger.error(f"❌ 启动失败: {e}")
-            raise
+            logger.error("❌ 消息处理器 %s 出错: %s", handler.__name__, e)
     
-    def disconnect(self):
-        """断开连接"""
-        if hasattr(self, 'node_process') and self.node_process:
+    async def disconnect_async(self):
+        """断开连接（不再处理尚未分发的事件）"""
+        self._closing.set()
+        if self._reader_task:
+            # 读取任务可能正阻塞在已满的队列上
+            self._reader_task.cancel()
+        for task in self._consumer_tasks:
+            task.cancel()
+        self._consumer_tasks = []
+        
+        # 关闭 socket 即分离会话；主进程在最后一个会话关闭后自行退出
+        if self._event_writer:
             logger.info("🛑 正在断开连接...")
-            self.node_process.terminate()
-            self.node_process.wait()
-            self.connected = False
+            self._event_writer.close()
+            self._event_writer = None
             logger.info("✅ 已断开连接")
+        if self.node_process:
+            # 回收已退出的主进程，避免留下僵尸进程
+            self.node_process.poll()
+        self.connected = False
+    
+    def disconnect(self):
+        """
+        断开连接（同步）
+        
+        可以在其他线程中调用：在客户端的事件循环上执行断开，
+        读取任务随事件 socket 关闭而结束，connect() 随之返回。
+        """
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is loop:
+                loop.create_task(self.disconnect_async())
+            else:
+                future = asyncio.run_coroutine_threadsafe(self.disconnect_async(), loop)
+                future.result(timeout=SHUTDOWN_TIMEOUT)
+            return
+        
+        # 事件循环已结束时 socket 已随之关闭，会话已分离
+        self.connected = False
 
 
 def main():
@@ -344,6 +840,10 @@ def main():
     
     client = WhatsAppWebClient(session_name=args.session)
     
+    # SIGHUP 时重新检查 Node.js 环境
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda *_: client.invalidate_check_cache())
+    
     try:
         client.connect()
     except KeyboardInterrupt: